@@ -1,26 +1,113 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, Response, current_app, g, has_request_context, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask import redirect, url_for, session, flash
 from datetime import datetime, date, timedelta
 from flask import jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
 import pymysql
 import os
 import calendar
+import math
 import random
-from sqlalchemy import text
-
-# --- Flask app ---
-app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates'))
-app.secret_key = "mysecretkey"
+import socket
+import base64
+import csv
+import io
+import hashlib
+import hmac
+import json
+import logging
+import time
+import click
+from collections import Counter
+from functools import wraps
+from itertools import groupby
+from types import SimpleNamespace
+from sqlalchemy import text, and_, or_, event, inspect, select, literal, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.schema import CreateTable
+from events import create_broker
+from security import PasswordHasher, RateLimiter, HasherBusy
+from cache import ResponseCache
+from metrics import Metrics
+from jobs import TaskRegistry, LocalJobQueue, backoff_delay
+from sessions import ServerSession, create_session_interface
+from pickups import plan_pickup_runs
+from pricing import PriceCache, PriceRuleView, RULE_KINDS, PER_KG, DELIVERY_FEE, DEFAULT_RATES, DEFAULT_DELIVERY_FEE
 
 # --- MySQL driver ---
 pymysql.install_as_MySQLdb()
 
-# --- Database config ---
-app.config['SQLALCHEMY_DATABASE_URI'] = "mysql+pymysql://root:@localhost/laundry_db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+# --- Database / routes (bound to an app in create_app()) ---
+db = SQLAlchemy()
+# cli_group=None keeps commands top-level: `flask init-db`, not `flask shop init-db`
+bp = Blueprint('shop', __name__, cli_group=None)
+
+
+def load_config():
+    """Settings from the environment, with the local development defaults."""
+    uri = os.environ.get('DATABASE_URL', "mysql+pymysql://root:@localhost/laundry_db")
+    engine_options = {
+        # MySQL closes idle connections after wait_timeout: ping on checkout and recycle before that
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 280)),
+    }
+    if not uri.startswith('sqlite'):
+        engine_options.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        })
+    return {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', "mysecretkey"),
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options,
+        # Set LAUNDRY_EVENTS_DB to a local SQLite file when running several worker processes
+        'EVENTS_DB': os.environ.get('LAUNDRY_EVENTS_DB'),
+        # Open /api/events streams allowed per worker process; each holds a server thread, so keep
+        # this below gunicorn's threads (WEB_THREADS) to leave room for ordinary requests
+        'MAX_EVENT_STREAMS': int(os.environ.get('MAX_EVENT_STREAMS', 8)),
+        # Password hashing pool and cost (werkzeug method string, e.g. "scrypt:32768:8:1")
+        'PASSWORD_HASH_METHOD': os.environ.get('PASSWORD_HASH_METHOD') or None,
+        'HASH_WORKERS': int(os.environ.get('HASH_WORKERS', 2)),
+        'HASH_QUEUE': int(os.environ.get('HASH_QUEUE', 8)),
+        # Login throttling: token buckets per username and per client IP
+        'LOGIN_USER_BURST': int(os.environ.get('LOGIN_USER_BURST', 5)),
+        'LOGIN_USER_PER_MINUTE': float(os.environ.get('LOGIN_USER_PER_MINUTE', 5)),
+        'LOGIN_IP_BURST': int(os.environ.get('LOGIN_IP_BURST', 30)),
+        'LOGIN_IP_PER_MINUTE': float(os.environ.get('LOGIN_IP_PER_MINUTE', 30)),
+        # Admin JSON response cache (per worker)
+        'RESPONSE_CACHE_TTL': float(os.environ.get('RESPONSE_CACHE_TTL', 30)),
+        'RESPONSE_CACHE_SIZE': int(os.environ.get('RESPONSE_CACHE_SIZE', 256)),
+        # Requests slower than this are logged with their slowest queries (0 disables the log)
+        'SLOW_REQUEST_MS': int(os.environ.get('SLOW_REQUEST_MS', 500)),
+        # Bearer token for scraping /metrics without an admin session
+        'METRICS_TOKEN': os.environ.get('METRICS_TOKEN') or None,
+        # How often each worker checks price_rule for changes made by other workers
+        'PRICE_CHECK_SECONDS': float(os.environ.get('PRICE_CHECK_SECONDS', 5)),
+        # Background jobs: "local" (in-process threads, not durable) or "db" (job table + `flask run-worker`).
+        # Order income is only deferred to a job with "db"; the local backend applies it in the order's transaction
+        'JOB_BACKEND': os.environ.get('JOB_BACKEND', 'local'),
+        'JOB_WORKERS': int(os.environ.get('JOB_WORKERS', 2)),
+        'JOB_RETRY_BASE': float(os.environ.get('JOB_RETRY_BASE', 5)),
+        # A running job whose worker hasn't finished it within this many seconds is requeued
+        'JOB_LEASE_SECONDS': int(os.environ.get('JOB_LEASE_SECONDS', 300)),
+        # Sessions: "sqlite" (server-side, shared by the workers on one host), "memory" (one process)
+        # or "cookie" (Flask's signed cookie; no revocation). SESSION_DB defaults to instance/sessions.db
+        'SESSION_BACKEND': os.environ.get('SESSION_BACKEND', 'sqlite'),
+        'SESSION_DB': os.environ.get('SESSION_DB') or None,
+        # Completed, paid orders older than this move to laundry_order_archive (`flask archive-orders`)
+        'ARCHIVE_AFTER_DAYS': int(os.environ.get('ARCHIVE_AFTER_DAYS', 180)),
+        # The customer dashboard polls /api/my_orders/changes this often. Each sync window reaches
+        # back ORDER_SYNC_LAG_SECONDS, so orders committed a little after their date_updated aren't missed
+        'ORDER_POLL_SECONDS': int(os.environ.get('ORDER_POLL_SECONDS', 15)),
+        'ORDER_SYNC_LAG_SECONDS': float(os.environ.get('ORDER_SYNC_LAG_SECONDS', 2)),
+        # Default load (total weight_kg) of one pickup run; /api/pickup_runs?capacity=<kg> overrides it
+        'PICKUP_RUN_CAPACITY_KG': float(os.environ.get('PICKUP_RUN_CAPACITY_KG', 25)),
+    }
+
 
 def generate_otp():
     """Generate a 6-digit OTP"""
@@ -30,7 +117,12 @@ def generate_otp():
 class User(db.Model):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100), unique=True, nullable=False)
+    # Binary collation on MySQL: usernames are case-sensitive and lookups still use the unique index
+    # (SQLite compares with BINARY by default)
+    username = db.Column(
+        db.String(100).with_variant(mysql.VARCHAR(100, charset='utf8mb4', collation='utf8mb4_bin'), 'mysql'),
+        unique=True, nullable=False
+    )
     password = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), default="customer")
     laundry_orders = db.relationship('LaundryOrder', backref='user', lazy=True, cascade="all, delete")
@@ -48,36 +140,174 @@ class LaundryOrder(db.Model):
     floor_number = db.Column(db.String(10))
     unit_number = db.Column(db.String(10))
     date_created = db.Column(db.DateTime, default=datetime.now)
-    date_updated = db.Column(db.DateTime, onupdate=datetime.now)
+    date_updated = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     payment_status = db.Column(db.String(20), default="Pending")
     is_paid = db.Column(db.Boolean, default=False)
 
+    # Access paths: pending list by status, per-customer history, admin list by date (keyset on date_created, id),
+    # per-customer changes since a date_updated watermark, pickups waiting by floor and unit
+    __table_args__ = (
+        db.Index('ix_order_status_created', 'status', 'date_created'),
+        db.Index('ix_order_user_created', 'user_id', 'date_created'),
+        db.Index('ix_order_created', 'date_created'),
+        db.Index('ix_order_user_updated', 'user_id', 'date_updated'),
+        db.Index('ix_order_pickup', 'pickup_requested', 'status', 'floor_number', 'unit_number'),
+        # Never hand out an id again once its order is archived or deleted (see upgrade_order_id_sequence())
+        {'sqlite_autoincrement': True},
+    )
+
+
+# Cold history: Completed, paid orders moved out of laundry_order by archive_orders(), ids kept.
+# Same columns as LaundryOrder; read paths only look here when asked (include_archived).
+class LaundryOrderArchive(db.Model):
+    __tablename__ = 'laundry_order_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    laundry_type = db.Column(db.String(100))
+    weight_kg = db.Column(db.Float)
+    price = db.Column(db.Float)
+    status = db.Column(db.String(50))
+    pickup_requested = db.Column(db.Boolean, default=False)
+    floor_number = db.Column(db.String(10))
+    unit_number = db.Column(db.String(10))
+    date_created = db.Column(db.DateTime)
+    date_updated = db.Column(db.DateTime)
+    payment_status = db.Column(db.String(20))
+    is_paid = db.Column(db.Boolean, default=False)
+    archived_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_archive_user_created', 'user_id', 'date_created'),
+        db.Index('ix_archive_created', 'date_created'),
+    )
+
 # New: persistent Income table — income entries are independent of users/orders
 class Income(db.Model):
     __tablename__ = 'income'
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, nullable=False, index=True)  # date-only
+    date = db.Column(db.Date, nullable=False, unique=True, index=True)  # date-only, one row per day
     total = db.Column(db.Float, default=0.0)
 
     def __repr__(self):
         return f"<Income {self.date} ₱{self.total}>"
 
 
+# Rollups of Income, kept in step by add_income_entry() / delete_income_month()
+# so totals and charts don't have to re-aggregate every daily row.
+class IncomeMonthly(db.Model):
+    __tablename__ = 'income_monthly'
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False, unique=True)  # first day of the month
+    total = db.Column(db.Float, default=0.0)
+
+
+class IncomeWeekly(db.Model):
+    __tablename__ = 'income_weekly'
+    id = db.Column(db.Integer, primary_key=True)
+    week_start = db.Column(db.Date, nullable=False, unique=True)  # Monday of the week
+    total = db.Column(db.Float, default=0.0)
+
+
+# Live order counts per customer, status and payment state (laundry_order only, not the archive).
+# Kept in step by count_orders() in the same transaction as each order write, so dashboards read
+# a few rows instead of counting orders. user_id SHOP_COUNTER (0) holds the whole shop's counts.
+class OrderCounter(db.Model):
+    __tablename__ = 'order_counter'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)  # no FK: 0 is the shop-wide row
+    status = db.Column(db.String(50), nullable=False)
+    is_paid = db.Column(db.Boolean, nullable=False)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'status', 'is_paid', name='uq_order_counter_key'),
+    )
+
+
+class PriceRule(db.Model):
+    """
+    A per-kg rate for one laundry type (kind='per_kg') or the delivery fee (kind='delivery_fee',
+    no laundry type), valid from effective_from (inclusive) to effective_to (exclusive); open
+    ends mean always. Change prices by adding a rule with a later effective_from.
+    """
+    __tablename__ = 'price_rule'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    laundry_type = db.Column(db.String(50), nullable=True)
+    amount = db.Column(db.Float, nullable=False)
+    effective_from = db.Column(db.Date, nullable=True)
+    effective_to = db.Column(db.Date, nullable=True)
+    date_created = db.Column(db.DateTime, default=datetime.now)
+    # Bumped by SQLAlchemy on every UPDATE; part of the version the price cache watches
+    revision = db.Column(db.Integer, nullable=False)
+    __mapper_args__ = {'version_id_col': revision}
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'laundry_type': self.laundry_type,
+            'amount': self.amount,
+            'effective_from': self.effective_from.isoformat() if self.effective_from else None,
+            'effective_to': self.effective_to.isoformat() if self.effective_to else None,
+        }
+
+
+class Job(db.Model):
+    """A queued side effect for `flask run-worker` (JOB_BACKEND=db). payload is JSON kwargs for the task."""
+    __tablename__ = 'job'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    date_created = db.Column(db.DateTime, default=datetime.now)
+    date_updated = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        # Workers look for due jobs by status and run_at
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+
+# --- Pricing (price_rule table, cached per worker; see pricing.py) ---
+def price_rules_version():
+    """Changes whenever a rule is added, updated or deleted; one aggregate query."""
+    return tuple(db.session.query(
+        db.func.count(PriceRule.id), db.func.max(PriceRule.id), db.func.sum(PriceRule.revision)
+    ).one())
+
+
+def load_price_rules():
+    return [
+        PriceRuleView(r.kind, r.laundry_type, r.amount, r.effective_from, r.effective_to, r.id)
+        for r in PriceRule.query
+    ]
+
+
+def current_prices():
+    """The PriceBook in force; a DB round-trip only when the cache re-checks the version."""
+    return current_app.extensions['prices'].current()
+
+
 # --- Helper ---
-def get_price_per_kg(laundry_type):
-    mapping = {
-        "Wash-Dry-Fold": 23,
-        "Wash-Dry-Press": 60,
-        "Press Only": 40,
-        "Special Items": 70
-    }
-    return mapping.get(laundry_type, 23)
+def format_timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else None
 
 
-def order_to_dict(order):
+def order_fields_to_dict(order, customer):
+    """
+    Serialize the order columns. `order` may be a LaundryOrder or a plain Row from
+    select_order_rows(), so list and export paths can skip building ORM objects.
+    """
     return {
         'id': order.id,
-        'customer': order.user.username if order.user else 'Unknown',
+        'customer': customer or 'Unknown',
         'laundry_type': order.laundry_type,
         'weight_kg': order.weight_kg,
         'price': float(order.price) if order.price else 0,
@@ -87,70 +317,790 @@ def order_to_dict(order):
         'status': order.status,
         'payment_status': order.payment_status,
         'is_paid': order.is_paid,
-        'date_created': order.date_created.strftime('%Y-%m-%d %H:%M') if order.date_created else None,
-        'date_updated': order.date_updated.strftime('%Y-%m-%d %H:%M') if getattr(order, 'date_updated', None) else None
+        'date_created': format_timestamp(order.date_created),
+        'date_updated': format_timestamp(getattr(order, 'date_updated', None))
     }
 
 
+def order_to_dict(order):
+    return order_fields_to_dict(order, order.user.username if order.user else None)
 
-def add_income_entry(entry_date: date, amount: float):
+
+def get_order(order_id, for_update=False):
     """
-    Add amount to Income table for the given date.
-    If an Income row for the date exists, increment it; otherwise create it.
+    Fetch one order with its customer eager-loaded, since order_to_dict() reads order.user.
+    for_update locks the order row until commit (SELECT ... FOR UPDATE) for read-modify-write
+    paths such as the order counters; the customer is then loaded separately, so only the
+    order row is locked.
     """
-    if amount is None:
+    if for_update:
+        return db.session.get(LaundryOrder, order_id, with_for_update=True)
+    return db.session.get(LaundryOrder, order_id, options=[db.joinedload(LaundryOrder.user)])
+
+
+def pending_orders_by_customer():
+    """
+    Pending orders grouped by customer username, newest first within each group.
+    Built from a single joined SELECT instead of walking user.laundry_orders per user.
+    """
+    rows = (
+        db.session.query(LaundryOrder, User.username)
+        .outerjoin(User, LaundryOrder.user_id == User.id)
+        .filter(LaundryOrder.status == "Pending")
+        .order_by(User.username, LaundryOrder.date_created.desc())
+        .all()
+    )
+    return [
+        (username or 'Unknown', [order for order, _ in group])
+        for username, group in groupby(rows, key=lambda row: row[1])
+    ]
+
+
+ORDER_COLUMN_NAMES = [column.name for column in LaundryOrder.__table__.columns]
+
+
+def select_order_rows(criteria_for, order_by, include_archived=False, limit=None):
+    """
+    SELECT the order columns, the customer's username and an `archived` flag.
+    criteria_for(table) / order_by(table) return WHERE / ORDER BY clauses for either order table.
+    With include_archived, laundry_order_archive is added by UNION ALL; each side is ordered and
+    limited on its own first, so both can walk their indexes instead of merging whole tables.
+    """
+    def branch(model, archived):
+        table = model.__table__
+        stmt = (
+            select(*[table.c[name] for name in ORDER_COLUMN_NAMES], User.username,
+                   literal(archived, db.Boolean).label('archived'))
+            .select_from(table.outerjoin(User.__table__, table.c.user_id == User.id))
+            .where(*criteria_for(table))
+            .order_by(*order_by(table))
+        )
+        return stmt.limit(limit) if limit else stmt
+
+    if not include_archived:
+        return branch(LaundryOrder, False)
+    combined = union_all(
+        select(branch(LaundryOrder, False).subquery()),
+        select(branch(LaundryOrderArchive, True).subquery()),
+    ).subquery()
+    stmt = select(combined).order_by(*order_by(combined))
+    return stmt.limit(limit) if limit else stmt
+
+
+def order_row_to_dict(row):
+    """order_fields_to_dict() for a select_order_rows() row, plus whether it came from the archive."""
+    data = order_fields_to_dict(row, row.username)
+    data['archived'] = bool(row.archived)
+    return data
+
+
+class QueryCounter:
+    """Context manager counting SQL statements sent through db.engine (guards against N+1 regressions)."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+        return False
+
+
+def publish_order_event(event_type, user_id, order_data):
+    """Push an order event to open /api/events streams. Call after the commit; never fails the request."""
+    try:
+        current_app.extensions['order_events'].publish(event_type, {'user_id': user_id, 'order': order_data})
+    except Exception as e:
+        print("🔥 Publish event error:", e)
+
+
+# --- Request / SQL instrumentation ---
+SLOW_LOG_STATEMENTS = 100  # statements remembered per request for the slow-request log
+
+# Slow requests are logged at WARNING with their slowest statements; route or silence via logging config
+slow_request_log = logging.getLogger('laundry_shop.slow_requests')
+
+
+def _before_sql(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is dropped with the statement even when it raises
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_sql(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None or not has_request_context():  # CLI commands and background threads
+        return
+    elapsed = time.perf_counter() - started
+    g.sql_statements = g.get('sql_statements', 0) + 1
+    g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+    log = g.setdefault('sql_log', [])
+    if len(log) < SLOW_LOG_STATEMENTS:
+        log.append((elapsed, statement))
+
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', _before_sql)
+    event.listen(engine, 'after_cursor_execute', _after_sql)
+
+
+@bp.before_app_request
+def _start_request_timer():
+    # Reset explicitly: g outlives the request when an app context was already pushed (CLI, scripts)
+    g.sql_statements, g.sql_seconds, g.sql_log = 0, 0.0, []
+    g.request_started = time.perf_counter()
+
+
+@bp.after_app_request
+def _record_request(response):
+    # Streamed bodies (SSE) are timed up to the first byte only and never count as slow
+    _observe_request(response.status_code, streamed=response.is_streamed)
+    return response
+
+
+@bp.teardown_app_request
+def _record_failed_request(exc):
+    # after_request is skipped when a view raises; the timer is still set in that case
+    if 'request_started' in g:
+        _observe_request(500)
+
+
+def _observe_request(status, streamed=False):
+    started = g.pop('request_started', None)
+    if started is None:
         return
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    statements = g.get('sql_statements', 0)
+    sql_seconds = g.get('sql_seconds', 0.0)
+    threshold = current_app.config['SLOW_REQUEST_MS']
+    slow = bool(threshold) and not streamed and elapsed * 1000 >= threshold
+    current_app.extensions['metrics'].observe_request(
+        endpoint, request.method, status, elapsed, statements, sql_seconds, slow=slow
+    )
+    if slow:
+        slowest = sorted(g.get('sql_log', []), key=lambda item: item[0], reverse=True)[:5]
+        slow_request_log.warning(
+            "Slow request %s %s (%s): %.0fms, %d queries, %.0fms in the database%s",
+            request.method, request.full_path, endpoint, elapsed * 1000, statements, sql_seconds * 1000,
+            ''.join(f"\n    {seconds * 1000:8.1f}ms  {' '.join(statement.split())[:300]}" for seconds, statement in slowest),
+        )
+
+
+# --- Response cache for admin JSON endpoints ---
+def mark_stale(*tags):
+    """Drop cached responses with these tags once the current transaction commits."""
+    db.session.info.setdefault('stale_tags', set()).update(tags)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session):
+    tags = session.info.pop('stale_tags', None)
+    if tags:
+        current_app.extensions['response_cache'].invalidate(*tags)
+        if 'prices' in tags:
+            current_app.extensions['prices'].invalidate()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_stale_tags(session):
+    session.info.pop('stale_tags', None)
+    session.info.pop('pending_jobs', None)
+
+
+# --- Background jobs (see jobs.py) ---
+tasks = TaskRegistry()
+
+
+def enqueue(name, **payload):
+    """
+    Run task `name` with these kwargs once the current transaction commits; nothing runs if it
+    rolls back. Does not commit. With JOB_BACKEND=db the job row commits with the caller's changes.
+    """
+    tasks.get(name)  # unknown task names fail in the request, not in a worker
+    if current_app.config['JOB_BACKEND'] == 'db':
+        db.session.add(Job(name=name, payload=json.dumps(payload), max_attempts=tasks.max_attempts(name)))
+    else:
+        db.session.info.setdefault('pending_jobs', []).append((name, payload))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _submit_local_jobs(session):
+    for name, payload in session.info.pop('pending_jobs', []):
+        current_app.extensions['jobs'].submit(name, payload)
+
+
+def run_task(name, payload):
+    """One attempt at a task; whatever it writes commits as one transaction."""
     try:
-        inc = Income.query.filter_by(date=entry_date).first()
-        if inc:
-            inc.total = (inc.total or 0.0) + float(amount)
-        else:
-            inc = Income(date=entry_date, total=float(amount))
-            db.session.add(inc)
+        tasks.get(name)(**payload)
         db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+@tasks.task('send_otp', max_attempts=5)
+def send_otp_task(username, otp):
+    # Stand-in for the email/SMS gateway call
+    print(f"OTP for {username}: {otp}")
+
+
+@tasks.task('apply_income', max_attempts=10)
+def apply_income_task(day, amount):
+    add_income_entry(date.fromisoformat(day), amount)
+
+
+def record_order_income(day, amount):
+    """
+    Count an order's price into income; never lost once the order commits. With JOB_BACKEND=db
+    it's an apply_income job row committed with the order and applied by a worker. The local
+    backend isn't durable (a restart drops its queue), so there the rollups are updated inline,
+    in the order's own transaction. Does not commit.
+    """
+    if current_app.config['JOB_BACKEND'] == 'db':
+        enqueue('apply_income', day=day.isoformat(), amount=amount)
+    else:
+        add_income_entry(day, amount)
+
+
+def claim_jobs(worker_id, limit):
+    """
+    Mark up to `limit` due jobs as running for this worker and return their ids. Each claim is a
+    conditional UPDATE, so two workers racing for the same row can't both win.
+    """
+    now = datetime.now()
+    lease = timedelta(seconds=current_app.config['JOB_LEASE_SECONDS'])
+    # Jobs whose worker died mid-run go back to the queue
+    Job.query.filter(Job.status == 'running', Job.locked_at < now - lease).update(
+        {'status': 'queued', 'locked_by': None, 'locked_at': None}, synchronize_session=False
+    )
+    due = [job_id for (job_id,) in db.session.query(Job.id)
+           .filter(Job.status == 'queued', Job.run_at <= now)
+           .order_by(Job.run_at).limit(limit)]
+    claimed = []
+    for job_id in due:
+        won = Job.query.filter(Job.id == job_id, Job.status == 'queued').update(
+            {'status': 'running', 'locked_by': worker_id, 'locked_at': now}, synchronize_session=False
+        )
+        if won:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+
+def run_job(job_id):
+    """Run a claimed job. Success commits the task's writes and status='done' together."""
+    job = db.session.get(Job, job_id)
+    try:
+        tasks.get(job.name)(**json.loads(job.payload))
+        job.status, job.locked_by, job.last_error = 'done', None, None
+        db.session.commit()
+        return True
     except Exception as e:
-        print("🔥 add_income_entry error:", e)
         db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.attempts += 1
+        job.last_error = repr(e)[:2000]
+        job.locked_by = job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+        else:
+            job.status = 'queued'
+            delay = backoff_delay(job.attempts, current_app.config['JOB_RETRY_BASE'])
+            job.run_at = datetime.now() + timedelta(seconds=delay)
+        db.session.commit()
+        print(f"🔥 Job {job.id} ({job.name}) attempt {job.attempts} failed:", e)
+        return False
+
+
+def cached_json(*tags):
+    """
+    Serve a JSON GET endpoint from the response cache for admins, keyed by path + query string.
+    Responses carry an ETag, so an unchanged payload answers If-None-Match with an empty 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if session.get('role') != 'admin':
+                return view(*args, **kwargs)
+
+            cache = current_app.extensions['response_cache']
+            key = request.full_path
+            hit = cache.get(key)
+            if hit:
+                body, etag = hit
+                resp = current_app.response_class(body, mimetype='application/json')
+            else:
+                generation = cache.generation
+                resp = current_app.make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+                body = resp.get_data()
+                etag = hashlib.sha1(body).hexdigest()
+                cache.set(key, body, etag, tags, generation=generation)
+
+            resp.set_etag(etag)
+            # Let the browser keep the body but always revalidate with If-None-Match
+            resp.headers['Cache-Control'] = 'private, no-cache'
+            return resp.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+# Statuses an order can be moved to by the admin
+ORDER_STATUSES = ("Pending", "Accepted", "Washing", "Drying", "Ready", "Claimed", "Completed")
+MAX_BULK_ORDERS = 500
+
+
+# Orders in these states still have to be collected when pickup_requested
+PICKUP_STATUSES = ("Pending", "Accepted")
+
+# Orders in these states are finished and may be purged
+PURGEABLE_STATUSES = ("Claimed", "Completed")
+
+
+def delete_rows(model, criteria, chunk_size=None, before_delete=None):
+    """
+    Set-based DELETE of the model rows matching criteria; returns the number of rows deleted.
+    Without chunk_size this is one DELETE statement and the caller commits.
+    With chunk_size, rows are deleted chunk_size primary keys at a time and each chunk is
+    committed on its own, so a large purge never holds row locks for long.
+    before_delete(criteria), if given, runs in each DELETE's transaction just before it.
+    """
+    if not chunk_size:
+        if before_delete:
+            before_delete(criteria)
+        return db.session.query(model).filter(*criteria).delete(synchronize_session=False)
+
+    total = 0
+    while True:
+        ids = [row_id for (row_id,) in db.session.query(model.id).filter(*criteria).limit(chunk_size)]
+        if not ids:
+            return total
+        chunk = [*criteria, model.id.in_(ids)]
+        if before_delete:
+            before_delete(chunk)
+        total += db.session.query(model).filter(*chunk).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def purge_orders(start, end, statuses=PURGEABLE_STATUSES, paid_only=True, chunk_size=None):
+    """
+    Delete orders (live and archived) in the given statuses created between start and end
+    (inclusive dates; start may be None).
+    """
+    deleted = 0
+    for model in (LaundryOrder, LaundryOrderArchive):
+        criteria = [model.status.in_(statuses), model.date_created < end + timedelta(days=1)]
+        if start:
+            criteria.append(model.date_created >= start)
+        if paid_only:
+            criteria.append(model.is_paid.is_(True))
+        deleted += delete_rows(model, criteria, chunk_size,
+                               before_delete=uncount_orders if model is LaundryOrder else None)
+    mark_stale('orders')
+    db.session.commit()
+    return deleted
+
+
+# Orders in these states move to laundry_order_archive once old enough (and paid)
+ARCHIVABLE_STATUSES = ("Completed",)
+
+
+def archive_orders(cutoff, batch_size=1000):
+    """
+    Move Completed, paid orders created before `cutoff` into laundry_order_archive, batch_size
+    orders at a time: INSERT ... SELECT then DELETE, one transaction per batch, so rows are never
+    in both tables or neither and no batch holds locks for long. Returns how many moved.
+    """
+    source = LaundryOrder.__table__
+    criteria = [
+        source.c.status.in_(ARCHIVABLE_STATUSES),
+        source.c.is_paid.is_(True),
+        source.c.date_created < cutoff,
+    ]
+    moved = 0
+    while True:
+        ids = [row_id for (row_id,) in db.session.execute(
+            select(source.c.id).where(*criteria).order_by(source.c.id).limit(batch_size).with_for_update()
+        )]
+        if not ids:
+            return moved
+        batch = [*criteria, source.c.id.in_(ids)]
+        uncount_orders(batch)
+        db.session.execute(LaundryOrderArchive.__table__.insert().from_select(
+            ORDER_COLUMN_NAMES + ['archived_at'],
+            select(*[source.c[name] for name in ORDER_COLUMN_NAMES], literal(datetime.now(), db.DateTime))
+            .where(*batch)
+        ))
+        db.session.execute(source.delete().where(*batch))
+        mark_stale('orders')
+        db.session.commit()
+        moved += len(ids)
+
+
+# --- Pagination helpers (keyset cursors) ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created, row_id):
+    """Opaque cursor for the last row of a page: (date_created, id)."""
+    raw = f"{created.isoformat() if created else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(). Returns (datetime or None, id) or raises ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created, row_id = raw.split('|', 1)
+        return (datetime.fromisoformat(created) if created else None), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_limit(value):
+    try:
+        limit = int(value) if value else DEFAULT_PAGE_SIZE
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def parse_bool_arg(value):
+    """'true'/'1'/'yes' -> True, 'false'/'0'/'no' -> False, anything else -> None (no filter)."""
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in ('1', 'true', 'yes', 'paid'):
+        return True
+    if value in ('0', 'false', 'no', 'unpaid'):
+        return False
+    return None
+
+
+
+# --- Income accounting (daily rows + monthly/weekly rollups) ---
+def month_start(day):
+    return day.replace(day=1)
+
+
+def week_monday(day):
+    return day - timedelta(days=day.weekday())
+
+
+def upsert_increment(model, keys, amount, column='total'):
+    """
+    Atomically add amount to model.<column> for the row whose unique key columns equal `keys`
+    ({name: value}), inserting the row if it doesn't exist yet. Does not commit.
+    """
+    dialect = db.session.get_bind().dialect.name
+    target = getattr(model, column)
+
+    if dialect == 'mysql':
+        stmt = mysql.insert(model).values({**keys, column: amount})
+        stmt = stmt.on_duplicate_key_update({column: target + stmt.inserted[column]})
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(model).values({**keys, column: amount})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[getattr(model, name) for name in keys],
+            set_={column: target + stmt.excluded[column]}
+        )
+    else:
+        # Generic fallback: lock the row for the rest of the transaction
+        row = model.query.filter_by(**keys).with_for_update().first()
+        if row:
+            setattr(row, column, (getattr(row, column) or 0) + amount)
+        else:
+            db.session.add(model(**keys, **{column: amount}))
+        return
+
+    db.session.execute(stmt)
+
+
+def add_income_entry(entry_date: date, amount: float):
+    """
+    Add amount to the Income row for the given date, creating it if needed, and to the
+    monthly/weekly rollups. Each is one database-side upsert on a unique key, so concurrent
+    orders on the same day can't lose updates. Does NOT commit: orders reach it through
+    record_order_income(), so it commits with the order or with the apply_income job's 'done' mark.
+    """
+    if amount is None:
+        return
+    amount = float(amount)
+    upsert_increment(Income, {'date': entry_date}, amount)
+    upsert_increment(IncomeMonthly, {'month': month_start(entry_date)}, amount)
+    upsert_increment(IncomeWeekly, {'week_start': week_monday(entry_date)}, amount)
+    mark_stale('income')
+
+
+def total_income_amount():
+    """All-time income, summed over the monthly rollup (one row per month)."""
+    return float(db.session.query(db.func.sum(IncomeMonthly.total)).scalar() or 0.0)
+
+
+def refresh_income_weeks(mondays):
+    """Recompute the given IncomeWeekly rows from Income (at most 7 daily rows each)."""
+    for monday in mondays:
+        total = db.session.query(db.func.sum(Income.total)).filter(
+            Income.date >= monday, Income.date < monday + timedelta(days=7)
+        ).scalar()
+        row = IncomeWeekly.query.filter_by(week_start=monday).first()
+        if total is None:
+            if row:
+                db.session.delete(row)
+        elif row:
+            row.total = float(total)
+        else:
+            db.session.add(IncomeWeekly(week_start=monday, total=float(total)))
+
+
+def week_grouping():
+    """
+    (group key, Monday of the week) SQL expressions for Mon→Sun weeks.
+    MySQL groups on YEARWEEK(date, 3); SQLite has no YEARWEEK so it groups on the Monday itself.
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        monday = db.func.date(Income.date, 'weekday 0', '-6 days')
+        return monday, monday
+    return db.func.yearweek(Income.date, 3), db.func.min(db.func.subdate(Income.date, db.func.weekday(Income.date)))
+
+
+def as_date(value):
+    # SQLite returns date() results as ISO strings
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def compute_income_rollups():
+    """Monthly and weekly totals aggregated straight from Income: ({month: total}, {monday: total})."""
+    year = db.extract('year', Income.date)
+    month = db.extract('month', Income.date)
+    monthly = {
+        date(int(y), int(m), 1): float(total or 0.0)
+        for y, m, total in db.session.query(year, month, db.func.sum(Income.total)).group_by(year, month)
+    }
+    week_key, week_start = week_grouping()
+    weekly = {
+        as_date(monday): float(total or 0.0)
+        for monday, total in db.session.query(week_start, db.func.sum(Income.total)).group_by(week_key)
+    }
+    return monthly, weekly
+
+
+def rollup_drift():
+    """Differences between the rollup tables and Income, as a list of readable lines."""
+    expected_months, expected_weeks = compute_income_rollups()
+    stored_months = {r.month: float(r.total or 0.0) for r in IncomeMonthly.query}
+    stored_weeks = {r.week_start: float(r.total or 0.0) for r in IncomeWeekly.query}
+
+    drift = []
+    for label, expected, stored in (('month', expected_months, stored_months),
+                                    ('week', expected_weeks, stored_weeks)):
+        for key in sorted(set(expected) | set(stored)):
+            want, have = expected.get(key, 0.0), stored.get(key, 0.0)
+            if abs(want - have) > 0.005:
+                drift.append(f"{label} {key}: rollup {have:.2f} != income {want:.2f}")
+    return drift
+
+
+def rebuild_income_rollups():
+    """Replace IncomeMonthly/IncomeWeekly with totals recomputed from Income (one transaction)."""
+    monthly, weekly = compute_income_rollups()
+    IncomeMonthly.query.delete(synchronize_session=False)
+    IncomeWeekly.query.delete(synchronize_session=False)
+    db.session.add_all([IncomeMonthly(month=k, total=v) for k, v in monthly.items()])
+    db.session.add_all([IncomeWeekly(week_start=k, total=v) for k, v in weekly.items()])
+    db.session.commit()
+    return len(monthly), len(weekly)
+
+
+# --- Order counters (order_counter table) ---
+SHOP_COUNTER = 0
+
+
+def count_orders(changes):
+    """
+    Apply order count changes in the current transaction; the caller commits. `changes` maps
+    (user_id, status, is_paid) to +n / -n, and each change also moves the shop-wide counter.
+    One upsert per counter touched, in key order so concurrent writers lock rows alike.
+    """
+    totals = Counter()
+    for (user_id, status, is_paid), n in changes.items():
+        for owner in (user_id, SHOP_COUNTER):
+            totals[(owner, status or '', bool(is_paid))] += n
+    for (user_id, status, is_paid), n in sorted(totals.items()):
+        if n:
+            upsert_increment(OrderCounter, {'user_id': user_id, 'status': status, 'is_paid': is_paid},
+                             n, column='orders')
+
+
+def count_order_change(user_id, before=None, after=None):
+    """One order moving from (status, is_paid) `before` to `after`; None when created / deleted."""
+    changes = Counter()
+    if before:
+        changes[(user_id, *before)] -= 1
+    if after:
+        changes[(user_id, *after)] += 1
+    count_orders(changes)
+
+
+def uncount_orders(criteria):
+    """Lock the live orders matching criteria and take them off the counters (before deleting them)."""
+    changes = Counter()
+    for user_id, status, is_paid in (
+        db.session.query(LaundryOrder.user_id, LaundryOrder.status, LaundryOrder.is_paid)
+        .filter(*criteria).with_for_update()
+    ):
+        changes[(user_id, status, is_paid)] -= 1
+    count_orders(changes)
+
+
+def order_counts(user_id=SHOP_COUNTER):
+    """Total, paid and per-status counts for one customer (or the shop) from its counter rows."""
+    counts = {'total': 0, 'paid': 0, 'unpaid': 0, 'by_status': {}}
+    for row in OrderCounter.query.filter_by(user_id=user_id):
+        if not row.orders:
+            continue
+        by_status = counts['by_status'].setdefault(row.status, {'total': 0, 'paid': 0})
+        by_status['total'] += row.orders
+        counts['total'] += row.orders
+        if row.is_paid:
+            by_status['paid'] += row.orders
+            counts['paid'] += row.orders
+        else:
+            counts['unpaid'] += row.orders
+    return counts
+
+
+def compute_order_counters():
+    """What every counter should hold, recounted from laundry_order (per customer and shop-wide)."""
+    status = db.func.coalesce(LaundryOrder.status, '')
+    is_paid = db.func.coalesce(LaundryOrder.is_paid, False)
+    counts = Counter()
+    for user_id, st, paid, n in (
+        db.session.query(LaundryOrder.user_id, status, is_paid, db.func.count(LaundryOrder.id))
+        .group_by(LaundryOrder.user_id, status, is_paid)
+    ):
+        for owner in (user_id, SHOP_COUNTER):
+            counts[(owner, st, bool(paid))] += n
+    return counts
+
+
+def order_counter_drift():
+    """Differences between order_counter and laundry_order, as a list of readable lines."""
+    expected = compute_order_counters()
+    stored = {(r.user_id, r.status, r.is_paid): r.orders for r in OrderCounter.query}
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        want, have = expected.get(key, 0), stored.get(key, 0)
+        if want != have:
+            user_id, status, is_paid = key
+            owner = 'shop' if user_id == SHOP_COUNTER else f'user {user_id}'
+            drift.append(f"{owner} {status or '(none)'} {'paid' if is_paid else 'unpaid'}: "
+                         f"counter {have} != orders {want}")
+    return drift
+
+
+def rebuild_order_counters():
+    """
+    Replace order_counter with counts recomputed from laundry_order (one transaction).
+    Orders written while it runs can still leave drift; `rebuild-order-counters --check` shows it.
+    """
+    counts = compute_order_counters()
+    OrderCounter.query.delete(synchronize_session=False)
+    db.session.add_all([
+        OrderCounter(user_id=user_id, status=status, is_paid=is_paid, orders=n)
+        for (user_id, status, is_paid), n in counts.items()
+    ])
+    db.session.commit()
+    return len(counts)
+
+
+# --- Session identity ---
+def start_user_session(user):
+    """Log the user in under a fresh session id, caching what later requests need from User."""
+    session.clear()
+    if isinstance(session, ServerSession):
+        session.regenerate()
+    session['user_id'] = user.id
+    session['role'] = user.role
+    session['username'] = user.username
+
+
+def current_user():
+    """The logged-in user's id, role and username from the session, or None. No query once cached."""
+    if 'user_id' not in session:
+        return None
+    if 'username' not in session:
+        # Sessions started before the username was cached: look it up once
+        user = db.session.get(User, session['user_id'])
+        if not user:
+            session.clear()
+            return None
+        session['role'] = user.role
+        session['username'] = user.username
+    return SimpleNamespace(id=session['user_id'], role=session.get('role'), username=session['username'])
 
 
 # --- ROUTES ---
-@app.route('/')
+@bp.route('/')
 def home():
-    return redirect(url_for('login'))
+    return redirect(url_for('shop.login'))
 
 
 # --- LOGIN ---
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
-        # Case-sensitive username check
-        user = User.query.filter(text("BINARY username = :username")).params(username=username).first()
+        # Throttle per client IP and per username before doing any hashing work
+        limits = current_app.extensions['login_limits']
+        if not (limits['ip'].allow(f"ip:{request.remote_addr}") and limits['user'].allow(f"user:{username}")):
+            flash("Too many login attempts. Please wait a minute and try again.", "error")
+            return render_template('login.html'), 429
+
+        # Case-sensitive via the column's binary collation, so this is a unique-index lookup
+        user = User.query.filter_by(username=username).first()
+
+        try:
+            valid = bool(user) and current_app.extensions['password_hasher'].verify(user.password, password)
+        except HasherBusy:
+            flash("The server is busy. Please try again in a moment.", "error")
+            return render_template('login.html'), 503
 
-        if user and check_password_hash(user.password, password):
+        if valid:
             # Store user info in session
-            session['user_id'] = user.id
-            session['role'] = user.role  # assuming you have a 'role' column: 'admin' or 'user'
+            start_user_session(user)
 
             flash("Login successful!", "success")
 
             # Redirect based on role
             if user.role == 'admin':
-                return redirect(url_for('admin_dashboard'))
+                return redirect(url_for('shop.admin_dashboard'))
             else:
-                return redirect(url_for('user_dashboard'))
+                return redirect(url_for('shop.user_dashboard'))
         else:
             flash("Invalid username or password!", "error")
-            return redirect(url_for('login'))
+            return redirect(url_for('shop.login'))
 
     return render_template('login.html')
 
 
 #register
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'GET':
         return render_template('register.html')
@@ -160,12 +1110,14 @@ def register():
     if not data:
         return jsonify({"success": False, "error": "No data received"})
 
-    username = data.get('username')
-    existing_user = User.query.filter_by(username=username).first()
-    if existing_user:
-        return jsonify({"success": False, "error": "Username already exists"})
+    if not current_app.extensions['login_limits']['ip'].allow(f"register-ip:{request.remote_addr}"):
+        return jsonify({"success": False, "error": "Too many attempts. Please wait a minute."}), 429
 
-    hashed_pw = generate_password_hash(data.get('password'))
+    username = data.get('username')
+    try:
+        hashed_pw = current_app.extensions['password_hasher'].hash(data.get('password'))
+    except HasherBusy:
+        return jsonify({"success": False, "error": "The server is busy. Please try again in a moment."}), 503
 
     # Create a new user in the database
     new_user = User(
@@ -174,20 +1126,24 @@ def register():
         role='customer'  # default role
     )
     db.session.add(new_user)
-    db.session.commit()
+    # The OTP goes out by email/SMS from a background job, only if the account is created
+    otp = generate_otp()
+    enqueue('send_otp', username=username, otp=otp)
+    try:
+        # The unique index decides: no check-then-insert race between concurrent sign-ups
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"success": False, "error": "Username already exists"})
 
     # Store additional info in session for OTP verification
     session['new_user_id'] = new_user.id
-    otp = generate_otp()
     session['otp'] = otp
 
-    # In production, send OTP via email/SMS
-    print(f"OTP for {username}: {otp}")
-
     return jsonify({"success": True, "otp": otp})
 
 # --- OTP verification ---
-@app.route('/verify_otp', methods=['POST'])
+@bp.route('/verify_otp', methods=['POST'])
 def verify_otp():
     user_id = session.get('new_user_id')
     sent_otp = session.get('otp')
@@ -205,15 +1161,12 @@ def verify_otp():
 
 
 # --- USER DASHBOARD ---
-@app.route('/user', methods=['GET', 'POST'])
+@bp.route('/user', methods=['GET', 'POST'])
 def user_dashboard():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-
-    user = User.query.get(session['user_id'])
+    # Identity comes from the session; no User query per request
+    user = current_user()
     if not user:
-        session.clear()
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
 
     
     
@@ -223,72 +1176,152 @@ def user_dashboard():
         laundry_type = request.form.get('laundry_type')
         if not laundry_type:
             flash("Please select a laundry type.", "danger")
-            return redirect(url_for('user_dashboard'))
+            return redirect(url_for('shop.user_dashboard'))
 
         # Validate weight
         try:
             weight = float(request.form.get('weight', 0))
-            if weight <= 0:
+            # NaN/inf would pass "<= 0" and poison the price and income rollups
+            if not (math.isfinite(weight) and weight > 0):
                 flash("Please enter a valid weight.", "danger")
-                return redirect(url_for('user_dashboard'))
+                return redirect(url_for('shop.user_dashboard'))
         except ValueError:
             flash("Please enter a valid weight.", "danger")
-            return redirect(url_for('user_dashboard'))
+            return redirect(url_for('shop.user_dashboard'))
 
         # Pickup/delivery
         pickup_requested = 'pickup_requested' in request.form
         floor = request.form.get('floor_number') if pickup_requested else None
         unit = request.form.get('unit_number') if pickup_requested else None
 
-        # Base price calculation
-        price = get_price_per_kg(laundry_type) * weight
-        if pickup_requested:
-            price += 20  # delivery fee
-
-       
-        # Create new order
-        new_order = LaundryOrder(
-            user_id=user.id,
-            laundry_type=laundry_type,
-            weight_kg=weight,
-            price=price,
-            pickup_requested=pickup_requested,
-            floor_number=floor,
-            unit_number=unit,
-            status="Pending"
-        )
-        db.session.add(new_order)
-        db.session.commit()
+        # Server-side price from the current price rules
+        now = datetime.now()
+        try:
+            price = current_prices().quote(laundry_type, weight, pickup_requested, now.date())
+        except ValueError:
+            flash("Please select a laundry type.", "danger")
+            return redirect(url_for('shop.user_dashboard'))
 
-        # Persist income at creation time
-        order_date = new_order.date_created.date() if new_order.date_created else datetime.now().date()
-        add_income_entry(order_date, price)
+        # Create new order; order and income increment share one transaction
+        try:
+            new_order = LaundryOrder(
+                user_id=user.id,
+                laundry_type=laundry_type,
+                weight_kg=weight,
+                price=price,
+                pickup_requested=pickup_requested,
+                floor_number=floor,
+                unit_number=unit,
+                status="Pending",
+                date_created=now
+            )
+            db.session.add(new_order)
+            count_order_change(user.id, after=("Pending", False))
+
+            record_order_income(now.date(), price)
+            mark_stale('orders')
+            db.session.commit()
+        except Exception as e:
+            print("🔥 Create Order Error:", e)
+            db.session.rollback()
+            flash("Could not submit your order. Please try again.", "danger")
+            return redirect(url_for('shop.user_dashboard'))
+
+        publish_order_event('order_created', user.id, order_fields_to_dict(new_order, user.username))
 
         flash("Order submitted successfully!", "success")
-        return redirect(url_for('user_dashboard'))
+        return redirect(url_for('shop.user_dashboard'))
+
+    # Fetch user orders; ?history=all adds archived ones
+    show_archived = request.args.get('history') == 'all'
+    orders = db.session.execute(select_order_rows(
+        lambda table: [table.c.user_id == user.id],
+        lambda table: [table.c.date_created.desc()],
+        include_archived=show_archived,
+    )).all()
+    prices = current_prices()
+    return render_template('user_dashboard.html', user=user, orders=orders, show_archived=show_archived,
+                           laundry_rates=prices.rates(), delivery_fee=prices.delivery_fee(),
+                           sync_watermark=order_sync_watermark(),
+                           order_poll_seconds=current_app.config['ORDER_POLL_SECONDS'])
+
+
+def order_sync_watermark():
+    """
+    Where the next /api/my_orders/changes call starts: now minus ORDER_SYNC_LAG_SECONDS.
+    date_updated is stamped before the commit, so a change can become visible slightly after
+    its timestamp; reaching back re-sends the last few seconds rather than missing it.
+    """
+    lag = timedelta(seconds=current_app.config['ORDER_SYNC_LAG_SECONDS'])
+    return (datetime.now() - lag).isoformat()
 
-    # Fetch user orders
-    orders = LaundryOrder.query.filter_by(user_id=user.id).order_by(LaundryOrder.date_created.desc()).all()
-    return render_template('user_dashboard.html', user=user, orders=orders)
+
+# --- Order changes since a watermark (customer dashboard polling) ---
+@bp.route('/api/my_orders/changes')
+def api_my_order_changes():
+    """
+    ?since=<watermark> -> the customer's live orders with date_updated at or after it, oldest
+    change first, the next watermark and the live order total (from the order counters).
+    With ids=1 also every live order id, so the client can drop orders deleted or archived meanwhile.
+    """
+    user = current_user()
+    if not user:
+        return jsonify({'success': False, 'error': 'User not logged in'}), 401
+    try:
+        since = datetime.fromisoformat(request.args['since'])
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': "A 'since' watermark (ISO date-time) is required"}), 400
+
+    try:
+        # Taken before reading so nothing changed during the read falls behind the watermark
+        watermark = order_sync_watermark()
+        rows = db.session.execute(
+            select(LaundryOrder.__table__)
+            .where(LaundryOrder.user_id == user.id, LaundryOrder.date_updated >= since)
+            .order_by(LaundryOrder.date_updated, LaundryOrder.id)
+        ).all()
+        payload = {
+            'success': True,
+            'orders': [order_fields_to_dict(row, user.username) for row in rows],
+            'watermark': watermark,
+            'total': order_counts(user.id)['total'],
+        }
+        if parse_bool_arg(request.args.get('ids')):
+            payload['ids'] = db.session.scalars(
+                select(LaundryOrder.id).where(LaundryOrder.user_id == user.id)
+            ).all()
+        return jsonify(payload)
+    except Exception as e:
+        print("🔥 Order Changes Error:", e)
+        return jsonify({'success': False, 'error': 'Server error'}), 500
 
 
 #order
-@app.route("/add_order", methods=["POST"])
+@bp.route("/add_order", methods=["POST"])
 def add_order():
     data = request.get_json()
     if not data:
         return jsonify({"message": "No data received"}), 400
-    if 'user_id' not in session:
+    user = current_user()
+    if not user:
         return jsonify({"message": "User not logged in"}), 401
 
     try:
-        user_id = session['user_id']
+        user_id = user.id
         laundry_type = data.get('laundry_type')
         weight = float(data.get('weight', 0))
-        price = float(data.get('price', 0))
         pickup_requested = bool(data.get('pickup_requested', False))
         floor = data.get('floor_number')
         unit = data.get('unit_number')
+        if not (math.isfinite(weight) and weight > 0):
+            return jsonify({"message": "Please enter a valid weight."}), 400
+
+        # The price is always computed here; any client-sent price is ignored
+        now = datetime.now()
+        try:
+            price = current_prices().quote(laundry_type, weight, pickup_requested, now.date())
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
 
         # Create new order using SQLAlchemy
         new_order = LaundryOrder(
@@ -300,15 +1333,16 @@ def add_order():
             floor_number=floor,
             unit_number=unit,
             status="Pending",
-            payment_status="Pending"
+            payment_status="Pending",
+            date_created=now
         )
-
         db.session.add(new_order)
-        db.session.commit()
+        count_order_change(user_id, after=("Pending", False))
 
-        # Persist income
-        order_date = new_order.date_created.date() if new_order.date_created else datetime.now().date()
-        add_income_entry(order_date, price)
+        record_order_income(now.date(), price)
+        mark_stale('orders')
+        db.session.commit()
+        publish_order_event('order_created', user_id, order_fields_to_dict(new_order, user.username))
 
         return jsonify({
             "id": new_order.id,
@@ -331,56 +1365,201 @@ def add_order():
 
 
 # --- ADMIN DASHBOARD ---
-@app.route('/admin')
+@bp.route('/admin')
 def admin_dashboard():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
 
-    user = User.query.get(session['user_id'])
+    user = current_user()
     if not user or user.role != 'admin':
-        return redirect(url_for('user_dashboard'))
+        return redirect(url_for('shop.user_dashboard'))
 
     try:
-        pending_orders = LaundryOrder.query.filter_by(status="Pending").order_by(LaundryOrder.date_created.desc()).all()
-        # outerjoin to avoid crashes if some orders point to deleted users
-        all_orders = db.session.query(LaundryOrder).outerjoin(User).order_by(LaundryOrder.date_created.desc()).all()
-        users = User.query.all()
+        # One joined query for the "pending per customer" section (no lazy load per user)
+        pending_groups = pending_orders_by_customer()
+        # All Orders is no longer rendered here: the table pages through /api/orders as the admin scrolls
+        total_customers = db.session.query(db.func.count(User.id)).scalar() or 0
 
         # total_income now comes from Income table so it stays even after deleting users/orders
-        total_income_row = db.session.query(db.func.sum(Income.total)).scalar()
-        total_income = float(total_income_row or 0.0)
+        total_income = total_income_amount()
 
         # monthly_income used by server-side template if needed (kept in case template uses it)
-        from sqlalchemy import func
-        monthly_income = db.session.query(
-            func.date_format(Income.date, '%Y-%m').label('month'),
-            func.sum(Income.total).label('total')
-        ).group_by(func.date_format(Income.date, '%Y-%m')).all()
+        monthly_income = [
+            (r.month.strftime('%Y-%m'), float(r.total or 0.0))
+            for r in IncomeMonthly.query.order_by(IncomeMonthly.month)
+        ]
 
-        # total_orders for summary card (counts current orders)
-        total_orders = db.session.query(db.func.count(LaundryOrder.id)).scalar() or 0
+        # Summary cards read the shop-wide order counters instead of counting orders
+        counts = order_counts()
 
         return render_template(
             'admin_dashboard.html',
             user=user,
-            users=users,
-            pending_orders=pending_orders,
-            all_orders=all_orders,
+            pending_groups=pending_groups,
             total_income=total_income,
             monthly_income=monthly_income,
-            total_orders=total_orders,
-            orders=all_orders  # keep variable name users template expects
+            total_orders=counts['total'],
+            pending_orders=counts['by_status'].get('Pending', {}).get('total', 0),
+            unpaid_orders=counts['unpaid'],
+            pickup_capacity=current_app.config['PICKUP_RUN_CAPACITY_KG'],
+            total_customers=total_customers,
+            page_size=DEFAULT_PAGE_SIZE
         )
     except Exception as e:
         print("🔥 ADMIN DASHBOARD ERROR:", e)
         flash("Admin dashboard error — check console.", "danger")
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
+
+
+# --- Pickup runs (Admin): waiting pickups grouped by floor and unit, capped by weight ---
+@bp.route('/api/pickup_runs')
+@cached_json('orders')
+def api_pickup_runs():
+    """
+    ?capacity=<kg> (default PICKUP_RUN_CAPACITY_KG) -> the orders waiting for pickup, split into
+    runs of at most that total weight_kg, each visiting floors and units in order (see pickups.py).
+    """
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    try:
+        capacity = float(request.args.get('capacity') or current_app.config['PICKUP_RUN_CAPACITY_KG'])
+        if not (math.isfinite(capacity) and capacity > 0):
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'error': 'capacity must be a positive number of kg'}), 400
+
+    try:
+        # Only the waiting pickups, read through ix_order_pickup; plan_pickup_runs() orders the
+        # stops numerically, so the SQL leaves ordering alone (floors are strings: "10" < "2")
+        table = LaundryOrder.__table__
+        rows = db.session.execute(
+            select(table, User.username)
+            .select_from(table.outerjoin(User.__table__, table.c.user_id == User.id))
+            .where(table.c.pickup_requested == True, table.c.status.in_(PICKUP_STATUSES))  # "=", not IS, keeps the index usable
+        ).all()
+        runs = plan_pickup_runs([order_fields_to_dict(row, row.username) for row in rows], capacity)
+        return jsonify({'success': True, 'capacity_kg': capacity, 'orders': len(rows), 'runs': runs})
+    except Exception as e:
+        print("🔥 Pickup Runs Error:", e)
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+
+
+# --- Order counts (shop-wide for admins, ?customer=<username> per customer) ---
+@bp.route('/api/order_counts')
+def api_order_counts():
+    user = current_user()
+    if not user:
+        return jsonify({'success': False, 'error': 'User not logged in'}), 401
+    customer = request.args.get('customer')
+    if user.role != 'admin':
+        # Customers only ever see their own counts
+        user_id = user.id
+    elif customer:
+        user_id = db.session.query(User.id).filter_by(username=customer).scalar()
+        if user_id is None:
+            return jsonify({'success': False, 'error': 'Customer not found'}), 404
+    else:
+        user_id = SHOP_COUNTER
+    return jsonify({'success': True, 'counts': order_counts(user_id)})
+
+
+# --- Paginated orders (Admin, keyset on date_created/id) ---
+@bp.route('/api/orders')
+@cached_json('orders')
+def api_orders():
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        include_archived = bool(parse_bool_arg(request.args.get('include_archived')))
+        status = request.args.get('status')
+        paid = parse_bool_arg(request.args.get('paid'))
+        customer = request.args.get('customer')
+        cursor = request.args.get('cursor')
+        created, last_id = decode_cursor(cursor) if cursor else (None, None)
+
+        # Server-side filters, applied to laundry_order (and laundry_order_archive when asked)
+        def criteria_for(table):
+            criteria = []
+            if status:
+                criteria.append(table.c.status == status)
+            if paid is not None:
+                criteria.append(table.c.is_paid.is_(paid))
+            if customer:
+                criteria.append(table.c.user_id.in_(select(User.id).where(User.username == customer)))
+            if cursor:
+                criteria.append(or_(
+                    table.c.date_created < created,
+                    and_(table.c.date_created == created, table.c.id < last_id)
+                ))
+            return criteria
+
+        def newest_first(table):
+            return [table.c.date_created.desc(), table.c.id.desc()]
+
+        # Fetch one extra row to know whether another page exists
+        rows = db.session.execute(
+            select_order_rows(criteria_for, newest_first, include_archived, limit=limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date_created, rows[-1].id) if has_more else None
+
+        return jsonify({
+            'success': True,
+            'orders': [order_row_to_dict(row) for row in rows],
+            'next_cursor': next_cursor
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print("🔥 Orders Page Error:", e)
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+
+
+# --- Paginated customers (Admin, keyset on id) ---
+@bp.route('/api/users')
+def api_users():
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        query = User.query
+
+        role = request.args.get('role')
+        if role:
+            query = query.filter(User.role == role)
+        search = request.args.get('q')
+        if search:
+            # prefix match so the unique index on username can still be used
+            query = query.filter(User.username.startswith(search, autoescape=True))
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                query = query.filter(User.id > int(cursor))
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+
+        rows = query.order_by(User.id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        return jsonify({
+            'success': True,
+            'users': [{'id': u.id, 'username': u.username, 'role': u.role} for u in rows],
+            'next_cursor': str(rows[-1].id) if has_more else None
+        })
+    except Exception as e:
+        print("🔥 Users Page Error:", e)
+        return jsonify({'success': False, 'error': 'Server error'}), 500
 
 
 ## --- Update order status (Admin: Ready, Completed, etc.) ---
-@app.route('/api/update_status/<int:order_id>', methods=['POST'])
+@bp.route('/api/update_status/<int:order_id>', methods=['POST'])
 def api_update_status(order_id):
-    order = LaundryOrder.query.get(order_id)
+    # Locked: the counters move from the status/payment state read here
+    order = get_order(order_id, for_update=True)
     if not order:
         return jsonify({'success': False, 'error': 'Order not found'}), 404
     try:
@@ -388,10 +1567,14 @@ def api_update_status(order_id):
         if not data or 'status' not in data:
             return jsonify({'success': False, 'error': 'No status provided'}), 400
 
+        count_order_change(order.user_id, (order.status, order.is_paid), (data['status'], order.is_paid))
         order.status = data['status']
         order.date_updated = datetime.now()
+        mark_stale('orders')
         db.session.commit()
-        return jsonify({'success': True, 'order': order_to_dict(order)})
+        payload = order_to_dict(order)
+        publish_order_event('order_status_changed', order.user_id, payload)
+        return jsonify({'success': True, 'order': payload})
     except Exception as e:
         print("🔥 Update Status Error:", e)
         db.session.rollback()
@@ -399,20 +1582,25 @@ def api_update_status(order_id):
 
 
 # --- Mark order as Paid (AJAX) ---
-@app.route('/api/mark_payment/<int:order_id>', methods=['POST'])
+@bp.route('/api/mark_payment/<int:order_id>', methods=['POST'])
 def api_mark_payment(order_id):
-    order = LaundryOrder.query.get(order_id)
+    # Locked: the counters move from the status/payment state read here
+    order = get_order(order_id, for_update=True)
     if not order:
         return jsonify({'success': False, 'error': 'Order not found'}), 404
     try:
         # Update payment info
+        count_order_change(order.user_id, (order.status, order.is_paid), (order.status, True))
         order.payment_status = "Paid"
         order.is_paid = True
         order.date_updated = datetime.now()
+        mark_stale('orders')
 
         db.session.commit()
 
-        return jsonify({'success': True, 'order': order_to_dict(order)})
+        payload = order_to_dict(order)
+        publish_order_event('order_paid', order.user_id, payload)
+        return jsonify({'success': True, 'order': payload})
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -420,14 +1608,23 @@ def api_mark_payment(order_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # --- Delete order (Admin) ---
-@app.route('/api/delete_order/<int:order_id>', methods=['POST', 'DELETE'])
+@bp.route('/api/delete_order/<int:order_id>', methods=['POST', 'DELETE'])
 def api_delete_order(order_id):
-    order = LaundryOrder.query.get(order_id)
-    if not order:
-        return jsonify({'success': False, 'error': 'Order not found'}), 404
     try:
-        db.session.delete(order)
+        # Single DELETE by primary key; nothing hangs off an order, so no need to load it first.
+        # Only the owner (for the customer's stream) and what the counters need are read.
+        found = (
+            db.session.query(LaundryOrder.user_id, LaundryOrder.status, LaundryOrder.is_paid)
+            .filter_by(id=order_id).with_for_update().first()
+        )
+        if found is None:
+            return jsonify({'success': False, 'error': 'Order not found'}), 404
+        owner_id = found.user_id
+        count_order_change(owner_id, before=(found.status, found.is_paid))
+        LaundryOrder.query.filter_by(id=order_id).delete(synchronize_session=False)
+        mark_stale('orders')
         db.session.commit()
+        publish_order_event('order_deleted', owner_id, {'id': order_id})
         return jsonify({'success': True, 'message': f'Order {order_id} deleted'})
     except Exception as e:
         import traceback
@@ -436,59 +1633,563 @@ def api_delete_order(order_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # --- ACCEPT ORDER (AJAX) ---
-@app.route('/api/accept_order/<int:order_id>', methods=['POST'])
+@bp.route('/api/accept_order/<int:order_id>', methods=['POST'])
 def api_accept_order(order_id):
-    order = LaundryOrder.query.get(order_id)
+    # Locked: the counters move from the status/payment state read here
+    order = get_order(order_id, for_update=True)
     if not order:
         return jsonify({'success': False, 'error': 'Order not found'}), 404
 
     try:
+        count_order_change(order.user_id, (order.status, order.is_paid), ("Accepted", order.is_paid))
         order.status = "Accepted"
         order.date_updated = datetime.now()
+        mark_stale('orders')
         db.session.commit()
-        return jsonify({'success': True, 'order': order_to_dict(order)})
+        payload = order_to_dict(order)
+        publish_order_event('order_status_changed', order.user_id, payload)
+        return jsonify({'success': True, 'order': payload})
     except Exception as e:
         print("🔥 Accept Order Error:", e)
         db.session.rollback()
         return jsonify({'success': False, 'error': 'Server error'}), 500
 
-# --- INCOME BY MONTH & DAY ---
-@app.route('/api/income_by_month')
-def api_income_by_month():
+# --- BULK STATUS / PAYMENT UPDATE (Admin) ---
+@bp.route('/api/orders/bulk_update', methods=['POST'])
+def api_bulk_update_orders():
+    """
+    Body: { "ids": [1, 2, ...], "status": "Ready" } and/or { "paid": true }.
+    Applies one set-based UPDATE in a single transaction and reports a result per id.
+    """
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') or []
+    if not isinstance(ids, list) or any(isinstance(i, bool) or not isinstance(i, int) for i in ids):
+        return jsonify({'success': False, 'error': 'ids must be a list of order ids'}), 400
+    ids = sorted(set(ids))
+    if not ids:
+        return jsonify({'success': False, 'error': 'No orders selected'}), 400
+    if len(ids) > MAX_BULK_ORDERS:
+        return jsonify({'success': False, 'error': f'At most {MAX_BULK_ORDERS} orders per request'}), 400
+
+    values = {}
+    status = data.get('status')
+    if status is not None:
+        if status not in ORDER_STATUSES:
+            return jsonify({'success': False, 'error': f'Unknown status: {status}'}), 400
+        values[LaundryOrder.status] = status
+    paid = data.get('paid')
+    if paid is not None:
+        if not isinstance(paid, bool):
+            return jsonify({'success': False, 'error': 'paid must be true or false'}), 400
+        values[LaundryOrder.is_paid] = paid
+        values[LaundryOrder.payment_status] = "Paid" if paid else "Pending"
+    if not values:
+        return jsonify({'success': False, 'error': 'No status or payment state provided'}), 400
+    values[LaundryOrder.date_updated] = datetime.now()
+
+    try:
+        # Lock the selected rows so the per-id result and the counters match what the UPDATE touched
+        locked = (
+            db.session.query(LaundryOrder.id, LaundryOrder.user_id, LaundryOrder.status, LaundryOrder.is_paid)
+            .filter(LaundryOrder.id.in_(ids)).with_for_update().all()
+        )
+        found = {row.id for row in locked}
+        changes = Counter()
+        for row in locked:
+            changes[(row.user_id, row.status, row.is_paid)] -= 1
+            changes[(row.user_id, status if status is not None else row.status,
+                     paid if paid is not None else row.is_paid)] += 1
+        count_orders(changes)
+        if found:
+            db.session.query(LaundryOrder).filter(LaundryOrder.id.in_(found)).update(
+                values, synchronize_session=False
+            )
+            mark_stale('orders')
+        db.session.commit()
+
+        orders = (
+            LaundryOrder.query.options(db.joinedload(LaundryOrder.user))
+            .filter(LaundryOrder.id.in_(found)).all()
+        ) if found else []
+
+        payloads = []
+        event_type = 'order_status_changed' if status is not None else 'order_paid'
+        for o in orders:
+            payload = order_to_dict(o)
+            publish_order_event(event_type, o.user_id, payload)
+            payloads.append(payload)
+
+        return jsonify({
+            'success': True,
+            'updated': len(found),
+            'results': {str(i): ('updated' if i in found else 'not_found') for i in ids},
+            'orders': payloads
+        })
+    except Exception as e:
+        print("🔥 Bulk Update Error:", e)
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+
+
+# --- BULK ORDER IMPORT (Admin, walk-in batches) ---
+def parse_import_order(item, customers, prices, day):
+    """Validate one walk-in order and price it server-side. Returns (row, error)."""
+    if not isinstance(item, dict):
+        return None, 'Expected an object'
+    customer = customers.get(str(item.get('customer') or '').strip())
+    if customer is None:
+        return None, f"Unknown customer: {item.get('customer')}"
+    laundry_type = item.get('laundry_type')
+    if prices.rate(laundry_type, day) is None:
+        return None, f"Unknown laundry type: {laundry_type}"
+    try:
+        weight = float(item.get('weight', 0))
+    except (TypeError, ValueError):
+        weight = 0
+    if not (math.isfinite(weight) and weight > 0):
+        return None, 'Weight must be a positive number'
+
+    pickup_requested = item.get('pickup_requested', False)
+    paid = item.get('paid', False)
+    if not (isinstance(pickup_requested, bool) and isinstance(paid, bool)):
+        return None, 'pickup_requested and paid must be true or false'
+
+    price = prices.quote(laundry_type, weight, pickup_requested, day)
+    return {
+        'user_id': customer,
+        'laundry_type': laundry_type,
+        'weight_kg': weight,
+        'price': price,
+        'pickup_requested': pickup_requested,
+        'floor_number': item.get('floor_number') if pickup_requested else None,
+        'unit_number': item.get('unit_number') if pickup_requested else None,
+        'status': "Pending",
+        'is_paid': paid,
+        'payment_status': "Paid" if paid else "Pending",
+    }, None
+
+
+@bp.route('/api/orders/bulk_create', methods=['POST'])
+def api_bulk_create_orders():
+    """
+    Body: { "orders": [ { "customer": "<username>", "laundry_type": "...", "weight": 3.5,
+                          "pickup_requested": false, "floor_number": null, "unit_number": null,
+                          "paid": false }, ... ] }
+    All-or-nothing: any invalid entry rejects the whole batch with per-index errors. Prices come
+    from the current price rules; the bulk INSERT and one income entry for the batch commit
+    together. Returns the created ids in request order.
+    """
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    items = (request.get_json(silent=True) or {}).get('orders')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'orders must be a non-empty list'}), 400
+    if len(items) > MAX_BULK_ORDERS:
+        return jsonify({'success': False, 'error': f'At most {MAX_BULK_ORDERS} orders per request'}), 400
+
+    try:
+        # Resolve every customer username in one query
+        usernames = {str(item.get('customer') or '').strip() for item in items if isinstance(item, dict)}
+        customers = dict(
+            db.session.query(User.username, User.id).filter(User.username.in_(usernames - {''}))
+        )
+
+        now = datetime.now()
+        prices = current_prices()
+        rows, errors = [], {}
+        for index, item in enumerate(items):
+            row, error = parse_import_order(item, customers, prices, now.date())
+            if error:
+                errors[str(index)] = error
+            else:
+                rows.append(row)
+        if errors:
+            return jsonify({'success': False, 'error': 'Invalid orders', 'errors': errors}), 400
+
+        for row in rows:
+            row['date_created'] = now
+            row['date_updated'] = now
+        insert_orders = LaundryOrder.__table__.insert()
+        if db.session.get_bind().dialect.insert_executemany_returning:
+            # One multi-row INSERT ... RETURNING id. Rows get ascending ids in VALUES order;
+            # RETURNING itself is unordered, so sort rather than ask for per-row statements
+            ids = sorted(db.session.scalars(insert_orders.returning(LaundryOrder.id), rows).all())
+        else:
+            # MySQL has no RETURNING: ids come from each INSERT's lastrowid, same transaction
+            ids = [db.session.execute(insert_orders, row).inserted_primary_key[0] for row in rows]
+
+        count_orders(Counter((row['user_id'], row['status'], row['is_paid']) for row in rows))
+        # One income entry for the whole batch instead of one per order
+        record_order_income(now.date(), sum(row['price'] for row in rows))
+        mark_stale('orders')
+        db.session.commit()
+
+        usernames_by_id = {user_id: username for username, user_id in customers.items()}
+        for order_id, row in zip(ids, rows):
+            order = SimpleNamespace(id=order_id, **row)
+            publish_order_event('order_created', row['user_id'],
+                                order_fields_to_dict(order, usernames_by_id.get(row['user_id'])))
+        return jsonify({'success': True, 'created': len(ids), 'ids': ids}), 201
+    except Exception as e:
+        print("🔥 Bulk Create Error:", e)
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+
+
+# --- PRICE RULES (Admin) ---
+@bp.route('/api/price_rules', methods=['GET', 'POST'])
+def api_price_rules():
+    """
+    GET: every rule plus the rates in force today.
+    POST: { "kind": "per_kg" | "delivery_fee", "laundry_type": "...", "amount": 250,
+            "effective_from": "YYYY-MM-DD", "effective_to": "YYYY-MM-DD" } adds a rule.
+    """
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    if request.method == 'GET':
+        prices = current_prices()
+        return jsonify({
+            'success': True,
+            'rules': [r.to_dict() for r in PriceRule.query.order_by(PriceRule.kind, PriceRule.laundry_type,
+                                                                     PriceRule.effective_from)],
+            'today': {'rates': prices.rates(), 'delivery_fee': prices.delivery_fee()},
+        })
+
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind')
+    laundry_type = (data.get('laundry_type') or '').strip() or None
+    if kind not in RULE_KINDS:
+        return jsonify({'success': False, 'error': f"kind must be one of: {', '.join(RULE_KINDS)}"}), 400
+    if (kind == PER_KG) != bool(laundry_type):
+        return jsonify({'success': False, 'error': 'laundry_type is required for per_kg rules only'}), 400
+    try:
+        amount = float(data.get('amount'))
+        dates = [datetime.strptime(data[k], "%Y-%m-%d").date() if data.get(k) else None
+                 for k in ('effective_from', 'effective_to')]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid amount or date (expected YYYY-MM-DD)'}), 400
+    if not (math.isfinite(amount) and amount >= 0):
+        return jsonify({'success': False, 'error': 'Amount must be a non-negative number'}), 400
+    if dates[0] and dates[1] and dates[1] <= dates[0]:
+        return jsonify({'success': False, 'error': 'effective_to must be after effective_from'}), 400
+
+    try:
+        rule = PriceRule(kind=kind, laundry_type=laundry_type, amount=amount,
+                         effective_from=dates[0], effective_to=dates[1])
+        db.session.add(rule)
+        mark_stale('prices')
+        db.session.commit()
+        return jsonify({'success': True, 'rule': rule.to_dict()}), 201
+    except Exception as e:
+        print("🔥 Price Rule Error:", e)
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+
+
+@bp.route('/api/price_rules/<int:rule_id>/end', methods=['POST'])
+def api_end_price_rule(rule_id):
+    """Stop a rule from a date on (body: { "effective_to": "YYYY-MM-DD" }, default today)."""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    rule = db.session.get(PriceRule, rule_id)
+    if not rule:
+        return jsonify({'success': False, 'error': 'Price rule not found'}), 404
+    value = (request.get_json(silent=True) or {}).get('effective_to')
+    try:
+        end = datetime.strptime(value, "%Y-%m-%d").date() if value else date.today()
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': "Invalid 'effective_to' date, expected YYYY-MM-DD"}), 400
+    if rule.effective_from and end <= rule.effective_from:
+        return jsonify({'success': False, 'error': 'effective_to must be after effective_from'}), 400
+
+    try:
+        rule.effective_to = end
+        mark_stale('prices')
+        db.session.commit()
+        return jsonify({'success': True, 'rule': rule.to_dict()})
+    except Exception as e:
+        print("🔥 Price Rule Error:", e)
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+
+
+# --- REVOKE SESSIONS (Admin) ---
+@bp.route('/api/users/<int:user_id>/revoke_sessions', methods=['POST'])
+def api_revoke_sessions(user_id):
+    """Log a user out everywhere: their next request on any worker finds no session."""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    store = getattr(current_app.session_interface, 'store', None)
+    if store is None:
+        return jsonify({'success': False, 'error': 'Revocation needs server-side sessions (SESSION_BACKEND)'}), 400
+    if not db.session.get(User, user_id):
+        return jsonify({'success': False, 'error': 'User not found'}), 404
     try:
-        from collections import defaultdict
-        from datetime import datetime
-        import calendar
+        return jsonify({'success': True, 'revoked': store.delete_user(user_id)})
+    except Exception as e:
+        print("🔥 Revoke Sessions Error:", e)
+        return jsonify({'success': False, 'error': 'Server error'}), 500
 
-        incomes = Income.query.order_by(Income.date.desc()).all()
-        monthly = defaultdict(float)
-        daily = defaultdict(float)
-        overall_total = 0.0
 
-        for inc in incomes:
-            if not inc.date:
+# --- LIVE ORDER EVENTS (Server-Sent Events) ---
+@bp.route('/api/events')
+def api_events():
+    """
+    text/event-stream of order_created / order_status_changed / order_paid / order_deleted.
+    Admins see every order, customers only their own. The stream never touches the database.
+    At most MAX_EVENT_STREAMS are open per worker; beyond that the answer is 503 and the page
+    carries on without live updates (customers' dashboards poll /api/my_orders/changes anyway).
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'User not logged in'}), 401
+    user_id = session['user_id']
+    is_admin = session.get('role') == 'admin'
+    broker = current_app.extensions['order_events']
+    subscription = broker.subscribe()
+    if subscription is None:
+        return jsonify({'success': False, 'error': 'Too many live streams, try again later'}), 503, {'Retry-After': '30'}
+
+    def stream():
+        yield "retry: 3000\n\n"
+        for event in broker.listen(subscription):
+            if event is None:
+                yield ": keep-alive\n\n"
                 continue
-            total = float(inc.total or 0.0)
-            overall_total += total
-            month_label = f"{calendar.month_name[inc.date.month]} {inc.date.year}"
-            monthly[month_label] += total
-            day_label = inc.date.strftime("%B %d, %Y")
-            daily[day_label] += total
-
-        def month_sort_key(m):
-            parts = m.split()
-            try:
-                mon = list(calendar.month_name).index(parts[0])
-                yr = int(parts[1])
-            except:
-                mon, yr = 0, 0
-            return (yr, mon)
+            if not is_admin and event['data'].get('user_id') != user_id:
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Frees the slot even if the client goes away before the stream starts
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
+
+
+# --- METRICS (Prometheus text format) ---
+@bp.route('/metrics')
+def metrics():
+    """Per-endpoint request timings and SQL counts for this worker. Admin session or METRICS_TOKEN bearer."""
+    token = current_app.config['METRICS_TOKEN']
+    bearer = request.headers.get('Authorization', '')
+    if session.get('role') != 'admin' and not (token and hmac.compare_digest(bearer, f"Bearer {token}")):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    return Response(current_app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
+
+
+# --- STREAMING EXPORTS (Admin, CSV / JSON Lines) ---
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+EXPORT_BATCH = 1000  # rows fetched per round-trip from the server-side cursor and per chunk sent
+
+ORDER_EXPORT_FIELDS = list(order_fields_to_dict(LaundryOrder(), None)) + ['archived']
+INCOME_EXPORT_FIELDS = ['date', 'total']
 
-        month_items = sorted(monthly.items(), key=lambda kv: month_sort_key(kv[0]), reverse=True)
-        day_items = sorted(daily.items(), key=lambda kv: datetime.strptime(kv[0], "%B %d, %Y"), reverse=True)
 
-        months_list = [{"month": k, "total": v} for k, v in month_items]
-        days_list = [{"day": k, "total": v} for k, v in day_items]
+def parse_list_arg(name):
+    """Repeated and/or comma-separated query values: ?status=Ready,Claimed&status=Completed"""
+    return [v.strip() for raw in request.args.getlist(name) for v in raw.split(',') if v.strip()]
+
+
+def stream_export(rows, fields, fmt, label):
+    """
+    Yield the export body in chunks of EXPORT_BATCH rows. `rows` yields dicts lazily, so memory
+    stays flat however large the table is. Errors are logged and re-raised: the server then aborts
+    the chunked response instead of ending it cleanly, so a failed export never looks complete.
+    """
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+        writer.writeheader()
+    try:
+        for count, row in enumerate(rows, 1):
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row))
+                buffer.write('\n')
+            if count % EXPORT_BATCH == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    except Exception as e:
+        print(f"🔥 {label} Export Error:", e)
+        raise
+
+
+def export_response(body, fmt, name):
+    filename = f"{name}-{datetime.now():%Y%m%d-%H%M}.{fmt}"
+    return Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
+
+
+@bp.route('/api/export/orders')
+def api_export_orders():
+    """
+    Stream every matching order, oldest first. Query params: format=csv|jsonl, from/to
+    (YYYY-MM-DD, inclusive, on date_created), status (repeatable or comma-separated),
+    include_archived=1 to add laundry_order_archive.
+    """
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': "format must be 'csv' or 'jsonl'"}), 400
+    try:
+        start, end = parse_date_arg('from'), parse_date_arg('to')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    statuses = parse_list_arg('status')
+    unknown = set(statuses) - set(ORDER_STATUSES)
+    if unknown:
+        return jsonify({'success': False, 'error': f"Unknown status: {', '.join(sorted(unknown))}"}), 400
+
+    include_archived = bool(parse_bool_arg(request.args.get('include_archived')))
+
+    def criteria_for(table):
+        criteria = []
+        if start:
+            criteria.append(table.c.date_created >= datetime.combine(start, datetime.min.time()))
+        if end:
+            criteria.append(table.c.date_created < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        if statuses:
+            criteria.append(table.c.status.in_(statuses))
+        return criteria
+
+    # Plain column rows (no ORM objects) read through a server-side cursor in EXPORT_BATCH chunks
+    stmt = select_order_rows(criteria_for, lambda table: [table.c.id], include_archived)
+    rows = (order_row_to_dict(row) for row in db.session.execute(
+        stmt, execution_options={'yield_per': EXPORT_BATCH}
+    ))
+    return export_response(stream_export(rows, ORDER_EXPORT_FIELDS, fmt, "Orders"), fmt, 'orders')
+
+
+@bp.route('/api/export/income')
+def api_export_income():
+    """Stream daily Income rows, oldest first. Query params: format=csv|jsonl, from/to (YYYY-MM-DD)."""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': "format must be 'csv' or 'jsonl'"}), 400
+    try:
+        start, end = parse_date_arg('from'), parse_date_arg('to')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    query = income_in_range(
+        db.session.query(Income.date, Income.total), start, end
+    ).order_by(Income.date).execution_options(yield_per=EXPORT_BATCH)
+    rows = ({'date': as_date(day).isoformat(), 'total': round(float(total or 0), 2)} for day, total in query)
+    return export_response(stream_export(rows, INCOME_EXPORT_FIELDS, fmt, "Income"), fmt, 'income')
+
+
+# --- PURGE OLD ORDERS (Admin) ---
+@bp.route('/api/purge_orders', methods=['POST'])
+def api_purge_orders():
+    """
+    Body: { "from": "YYYY-MM-DD", "to": "YYYY-MM-DD", "statuses": [...], "paid_only": true, "chunk_size": 1000 }.
+    Deletes finished orders created in the inclusive date range. Income is kept (it lives in its own table).
+    """
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    data = request.get_json(silent=True) or {}
+    try:
+        start = datetime.strptime(data['from'], "%Y-%m-%d").date() if data.get('from') else None
+        end = datetime.strptime(data['to'], "%Y-%m-%d").date()
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'error': "A 'to' date (YYYY-MM-DD) is required; 'from' is optional"}), 400
+
+    statuses = data.get('statuses') or list(PURGEABLE_STATUSES)
+    if any(st not in ORDER_STATUSES for st in statuses):
+        return jsonify({'success': False, 'error': 'Unknown status in statuses'}), 400
+    paid_only = data.get('paid_only', True)
+    if not isinstance(paid_only, bool):
+        return jsonify({'success': False, 'error': 'paid_only must be true or false'}), 400
+    # 0 or absent: one DELETE statement, as with `flask purge-orders --chunk-size 0`
+    chunk_size = data.get('chunk_size') or None
+    if chunk_size is not None and (isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size < 0):
+        return jsonify({'success': False, 'error': 'chunk_size must be a non-negative integer'}), 400
+
+    try:
+        deleted = purge_orders(start, end, statuses, paid_only=paid_only, chunk_size=chunk_size)
+        return jsonify({'success': True, 'deleted': deleted})
+    except Exception as e:
+        print("🔥 Purge Orders Error:", e)
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Server error'}), 500
+
+
+# --- Income aggregation helpers ---
+def parse_date_arg(name):
+    """Read an optional YYYY-MM-DD query parameter. Raises ValueError on bad input."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' date, expected YYYY-MM-DD")
+
+
+def income_in_range(query, start, end):
+    """Apply the inclusive from/to date range to a query over Income."""
+    if start:
+        query = query.filter(Income.date >= start)
+    if end:
+        query = query.filter(Income.date <= end)
+    return query
+
+
+# --- INCOME BY MONTH & DAY ---
+@bp.route('/api/income_by_month')
+@cached_json('income')
+def api_income_by_month():
+    try:
+        start, end = parse_date_arg('from'), parse_date_arg('to')
+
+        if start or end:
+            # Arbitrary ranges may cut months in half, so aggregate the daily rows
+            year = db.extract('year', Income.date)
+            month = db.extract('month', Income.date)
+            month_rows = income_in_range(
+                db.session.query(year.label('year'), month.label('month'), db.func.sum(Income.total)),
+                start, end
+            ).group_by(year, month).order_by(year.desc(), month.desc()).all()
+        else:
+            month_rows = [
+                (r.month.year, r.month.month, r.total)
+                for r in IncomeMonthly.query.order_by(IncomeMonthly.month.desc())
+            ]
+
+        months_list = [
+            {
+                "month": f"{calendar.month_name[int(m)]} {int(y)}",
+                "key": f"{int(y):04d}-{int(m):02d}",
+                "total": float(total or 0.0)
+            }
+            for y, m, total in month_rows
+        ]
+        overall_total = sum(m["total"] for m in months_list)
+
+        # Daily breakdown is optional (?days=0 skips it) since it grows with every day of history
+        days_list = []
+        if request.args.get('days') != '0':
+            day_rows = income_in_range(
+                db.session.query(Income.date, db.func.sum(Income.total)), start, end
+            ).group_by(Income.date).order_by(Income.date.desc()).all()
+            days_list = [
+                {"day": d.strftime("%B %d, %Y"), "date": d.isoformat(), "total": float(total or 0.0)}
+                for d, total in day_rows
+            ]
 
         return jsonify({
             "success": True,
@@ -497,51 +2198,58 @@ def api_income_by_month():
             "overall_total": overall_total
         })
 
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         print("🔥 Income Error:", e)
         return jsonify({"success": False, "error": "Server error"}), 500
 
 
 # --- INCOME BY WEEK (Mon → Sun) ---
-@app.route('/api/income_by_week')
+@bp.route('/api/income_by_week')
+@cached_json('income')
 def api_income_by_week():
     try:
-        from datetime import timedelta, datetime
-
-        incomes = Income.query.order_by(Income.date).all()
-        daily_map = {inc.date: float(inc.total or 0.0) for inc in incomes}
-
-        if not daily_map:
+        start, end = parse_date_arg('from'), parse_date_arg('to')
+
+        # Weeks come from the IncomeWeekly rollup, which only has rows for weeks with income.
+        # A week is included when it overlaps the range; its total is the whole week's.
+        query = IncomeWeekly.query
+        if start:
+            query = query.filter(IncomeWeekly.week_start >= week_monday(start))
+        if end:
+            query = query.filter(IncomeWeekly.week_start <= end)
+        week_rows = query.order_by(IncomeWeekly.week_start).all()
+        if not week_rows:
             return jsonify({"success": True, "weeks": []})
 
-        min_date = min(daily_map.keys())
-        max_date = max(daily_map.keys())
-
-        min_monday = min_date - timedelta(days=min_date.weekday())
-        max_sunday = max_date + timedelta(days=(6 - max_date.weekday()))
+        first, last = week_rows[0].week_start, week_rows[-1].week_start + timedelta(days=6)
+        day_rows = income_in_range(
+            db.session.query(Income.date, db.func.sum(Income.total)), first, last
+        ).group_by(Income.date).all()
+        daily_map = {d: float(total or 0.0) for d, total in day_rows}
 
         weeks = []
-        current = min_monday
-        while current <= max_sunday:
-            week = []
-            for i in range(7):
-                day = current + timedelta(days=i)
-                week.append({
-                    "date": day.strftime("%A %b %d, %Y"),
-                    "total": daily_map.get(day, 0.0)
-                })
-            weeks.append(week)
-            current += timedelta(days=7)
+        for row in week_rows:
+            monday, total = row.week_start, row.total
+            days = [monday + timedelta(days=i) for i in range(7)]
+            weeks.append({
+                "week_start": monday.isoformat(),
+                "total": float(total or 0.0),
+                "days": [{"date": d.strftime("%A %b %d, %Y"), "total": daily_map.get(d, 0.0)} for d in days]
+            })
 
         return jsonify({"success": True, "weeks": weeks})
 
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         print("🔥 Weekly Income Error:", e)
         return jsonify({"success": False, "error": "Server error"}), 500
 
 
 # --- DELETE MONTHLY INCOME ---
-@app.route('/api/delete_income_month', methods=['POST'])
+@bp.route('/api/delete_income_month', methods=['POST'])
 def delete_income_month():
     try:
         payload = request.get_json(force=True)
@@ -549,7 +2257,6 @@ def delete_income_month():
         if not month_str:
             return jsonify(success=False, error="No month provided"), 400
 
-        from datetime import datetime, date
         year, month = map(int, month_str.split('-'))
 
         # Compute start and end of month
@@ -559,16 +2266,20 @@ def delete_income_month():
         else:
             end_date = date(year, month + 1, 1)
 
-        # Query incomes in that month
-        rows = Income.query.filter(Income.date >= start_date, Income.date < end_date).all()
-        deleted = 0
-        for r in rows:
-            db.session.delete(r)
-            deleted += 1
+        # One set-based DELETE for the month's daily rows
+        deleted = delete_rows(Income, [Income.date >= start_date, Income.date < end_date])
+
+        # Adjust rollups in the same transaction: drop the month, recompute the weeks it touched
+        IncomeMonthly.query.filter_by(month=start_date).delete(synchronize_session=False)
+        first_monday, last_monday = week_monday(start_date), week_monday(end_date - timedelta(days=1))
+        refresh_income_weeks(
+            first_monday + timedelta(weeks=i) for i in range((last_monday - first_monday).days // 7 + 1)
+        )
+        mark_stale('income')
         db.session.commit()
 
         # Update total income
-        total_income = db.session.query(db.func.sum(Income.total)).scalar() or 0
+        total_income = total_income_amount()
 
         return jsonify(success=True, deleted=deleted, total_income=total_income)
 
@@ -580,9 +2291,8 @@ def delete_income_month():
 
 
     
-# --- Initialize DB ---
-with app.app_context():
-    db.create_all()
+# --- Initialize DB (explicit, so worker start-up never touches the database) ---
+def seed_admin():
     if not User.query.filter_by(username='admin').first():
         admin = User(username='admin', password=generate_password_hash('admin123'), role='admin')
         db.session.add(admin)
@@ -590,17 +2300,382 @@ with app.app_context():
         print("✅ Default admin created: admin / admin123")
 
 
-from flask import redirect, url_for, session, flash
+def seed_price_rules():
+    """Store the built-in price list as rules when price_rule is empty. Returns True if it did."""
+    if PriceRule.query.first():
+        return False
+    db.session.add_all([PriceRule(kind=PER_KG, laundry_type=name, amount=amount)
+                        for name, amount in DEFAULT_RATES.items()])
+    db.session.add(PriceRule(kind=DELIVERY_FEE, amount=DEFAULT_DELIVERY_FEE))
+    mark_stale('prices')
+    db.session.commit()
+    return True
+
+
+@bp.cli.command('init-db')
+def init_db():
+    """Create the tables, the default admin account and the default price rules."""
+    db.create_all()
+    seed_admin()
+    seed_price_rules()
+    print("✅ Database initialized")
+
 
-@app.route('/logout', methods=['GET', 'POST'])
+# --- Schema upgrades for existing databases ---
+# db.create_all() only creates missing tables; these steps bring older laundry_db schemas up to date.
+# Each step is idempotent and returns True when it changed something.
+def _index(table, name):
+    return next(ix for ix in table.indexes if ix.name == name)
+
+
+def upgrade_income_unique_date():
+    """Merge duplicate Income rows per date, then make ix_income_date a unique index (needed by the upsert)."""
+    existing = {ix['name']: ix for ix in inspect(db.engine).get_indexes('income')}
+    if existing.get('ix_income_date', {}).get('unique'):
+        return False
+
+    dupes = (
+        db.session.query(Income.date, db.func.sum(Income.total), db.func.min(Income.id))
+        .group_by(Income.date)
+        .having(db.func.count(Income.id) > 1)
+        .all()
+    )
+    for day, total, keep_id in dupes:
+        Income.query.filter(Income.date == day, Income.id != keep_id).delete(synchronize_session=False)
+        Income.query.filter_by(id=keep_id).update({'total': total}, synchronize_session=False)
+    db.session.commit()
+
+    index = _index(Income.__table__, 'ix_income_date')
+    with db.engine.begin() as conn:
+        if 'ix_income_date' in existing:
+            index.drop(bind=conn)
+        index.create(bind=conn)
+    return True
+
+
+def upgrade_income_rollups():
+    """Backfill IncomeMonthly/IncomeWeekly for databases that only have daily Income rows."""
+    if IncomeMonthly.query.first() or not Income.query.first():
+        return False
+    rebuild_income_rollups()
+    return True
+
+
+def upgrade_order_counters():
+    """Fill order_counter from the existing orders the first time."""
+    if OrderCounter.query.first() or not LaundryOrder.query.first():
+        return False
+    rebuild_order_counters()
+    return True
+
+
+def upgrade_missing_indexes(model):
+    """Create any index declared on the model that the existing table doesn't have yet."""
+    def step():
+        existing = {ix['name'] for ix in inspect(db.engine).get_indexes(model.__tablename__)}
+        missing = [ix for ix in model.__table__.indexes if ix.name not in existing]
+        with db.engine.begin() as conn:
+            for index in missing:
+                index.create(bind=conn)
+        return bool(missing)
+    return step
+
+
+def upgrade_username_binary_collation():
+    """MySQL only: switch user.username to utf8mb4_bin so case-sensitive lookups can use its index."""
+    if db.engine.dialect.name != 'mysql':
+        return False
+    column = next(c for c in inspect(db.engine).get_columns('user') if c['name'] == 'username')
+    if getattr(column['type'], 'collation', None) == 'utf8mb4_bin':
+        return False
+    # Safe: the old case-insensitive unique index already ruled out names differing only by case
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE `user` MODIFY username VARCHAR(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL"
+        ))
+    return True
+
+
+def highest_order_id():
+    """The highest order id ever kept, live or archived."""
+    return max(db.session.query(db.func.max(LaundryOrder.id)).scalar() or 0,
+               db.session.query(db.func.max(LaundryOrderArchive.id)).scalar() or 0)
+
+
+def upgrade_order_id_sequence():
+    """
+    Make laundry_order stop reusing ids of archived or deleted orders.
+    SQLite: tables created before sqlite_autoincrement hand out max(id) + 1, so rebuild the table
+    with AUTOINCREMENT and start its sequence past the archive. MySQL: move AUTO_INCREMENT past the
+    archive; before 8.0 the server resets it to max(id) + 1 on restart, so re-run upgrade-db then.
+    """
+    dialect = db.engine.dialect
+    table = LaundryOrder.__table__
+    if dialect.name == 'mysql':
+        if dialect.server_version_info < (8,):
+            print("⚠️ MySQL < 8.0 forgets AUTO_INCREMENT on restart: run upgrade-db after every server restart")
+        next_id = highest_order_id() + 1
+        current = db.session.execute(text(
+            "SELECT AUTO_INCREMENT FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'laundry_order'"
+        )).scalar()
+        db.session.commit()
+        if current and current >= next_id:
+            return False
+        with db.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE laundry_order AUTO_INCREMENT = {int(next_id)}"))
+        return True
+    if dialect.name != 'sqlite':
+        return False
+
+    ddl = db.session.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'laundry_order'")).scalar()
+    highest = highest_order_id()
+    db.session.commit()
+    if 'AUTOINCREMENT' in (ddl or '').upper():
+        return False
+    # SQLite can't ALTER a column into AUTOINCREMENT: copy into a new table and swap it in
+    create = str(CreateTable(table).compile(dialect=dialect)).replace(
+        'CREATE TABLE laundry_order ', 'CREATE TABLE laundry_order_new ', 1)
+    columns = ', '.join(ORDER_COLUMN_NAMES)
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS laundry_order_new"))
+        conn.execute(text(create))
+        conn.execute(text(f"INSERT INTO laundry_order_new ({columns}) SELECT {columns} FROM laundry_order"))
+        conn.execute(text("DROP TABLE laundry_order"))
+        conn.execute(text("ALTER TABLE laundry_order_new RENAME TO laundry_order"))
+        for index in table.indexes:
+            index.create(bind=conn)
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'laundry_order'"))
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('laundry_order', :seq)"), {'seq': highest})
+    return True
+
+
+SCHEMA_UPGRADES = [
+    ('income: unique date', upgrade_income_unique_date),
+    ('income: monthly/weekly rollups', upgrade_income_rollups),
+    ('laundry_order: missing indexes', upgrade_missing_indexes(LaundryOrder)),
+    ('user: case-sensitive username collation', upgrade_username_binary_collation),
+    ('price_rule: default prices', seed_price_rules),
+    ('laundry_order_archive: user/date indexes', upgrade_missing_indexes(LaundryOrderArchive)),
+    ('order_counter: initial counts', upgrade_order_counters),
+    ('laundry_order: never reuse ids', upgrade_order_id_sequence),
+]
+
+
+@bp.cli.command('upgrade-db')
+def upgrade_db():
+    """Create missing tables and apply SCHEMA_UPGRADES to an existing database."""
+    db.create_all()
+    for name, step in SCHEMA_UPGRADES:
+        changed = step()
+        print(f"{'✅ applied' if changed else '— up to date'}: {name}")
+
+
+@bp.cli.command('rebuild-income-rollups')
+@click.option('--check', is_flag=True, help="Only report drift; exit 1 if the rollups disagree with Income.")
+def rebuild_income_rollups_command(check):
+    """Recompute IncomeMonthly/IncomeWeekly from Income and verify them against it."""
+    if not check:
+        months, weeks = rebuild_income_rollups()
+        print(f"Rebuilt {months} monthly and {weeks} weekly rollup rows")
+
+    drift = rollup_drift()
+    for line in drift:
+        print("  ", line)
+    if drift:
+        raise SystemExit(1)
+    print("✅ Rollups match Income")
+
+
+@bp.cli.command('rebuild-order-counters')
+@click.option('--check', is_flag=True, help="Only report drift; exit 1 if the counters disagree with the orders.")
+def rebuild_order_counters_command(check):
+    """Recount order_counter from laundry_order and verify it."""
+    if not check:
+        print(f"Rebuilt {rebuild_order_counters()} order counters")
+
+    drift = order_counter_drift()
+    for line in drift:
+        print("  ", line)
+    if drift:
+        raise SystemExit(1)
+    print("✅ Order counters match the orders")
+
+
+def explain(query):
+    """Return the database's plan for an ORM query as one lowercase string (EXPLAIN / EXPLAIN QUERY PLAN)."""
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.execute(text(prefix + sql)).all()
+    return ' | '.join(' '.join(str(v) for v in row) for row in rows).lower()
+
+
+@bp.cli.command('explain-indexes')
+def explain_indexes():
+    """Check via EXPLAIN that the hot LaundryOrder queries use their indexes."""
+    any_user = db.session.query(User.id).limit(1).scalar() or 1
+    checks = [
+        ('pending orders by date', 'ix_order_status_created',
+         LaundryOrder.query.filter_by(status="Pending").order_by(LaundryOrder.date_created.desc())),
+        ('customer order history', 'ix_order_user_created',
+         LaundryOrder.query.filter_by(user_id=any_user).order_by(LaundryOrder.date_created.desc())),
+        ('admin orders page', 'ix_order_created',
+         LaundryOrder.query.order_by(LaundryOrder.date_created.desc(), LaundryOrder.id.desc()).limit(DEFAULT_PAGE_SIZE)),
+        ('waiting pickups', 'ix_order_pickup',
+         LaundryOrder.query.filter(LaundryOrder.pickup_requested == True, LaundryOrder.status.in_(PICKUP_STATUSES))),
+        ('customer order changes', 'ix_order_user_updated',
+         LaundryOrder.query.filter(LaundryOrder.user_id == any_user, LaundryOrder.date_updated >= datetime.now())
+         .order_by(LaundryOrder.date_updated, LaundryOrder.id)),
+    ]
+
+    failed = False
+    for name, index, query in checks:
+        plan = explain(query)
+        ok = index in plan
+        failed = failed or not ok
+        print(f"{'✅' if ok else '❌'} {name}: expects {index}")
+        if not ok:
+            print("    plan:", plan)
+    if failed:
+        # On a near-empty table MySQL may prefer a full scan; re-run with realistic data before worrying
+        raise SystemExit(1)
+
+
+@bp.cli.command('purge-orders')
+@click.option('--before', 'end', required=True, type=click.DateTime(formats=["%Y-%m-%d"]), help="Last creation date to purge (inclusive).")
+@click.option('--after', 'start', type=click.DateTime(formats=["%Y-%m-%d"]), help="First creation date to purge (inclusive).")
+@click.option('--status', 'statuses', multiple=True, default=PURGEABLE_STATUSES, show_default=True)
+@click.option('--include-unpaid', is_flag=True, help="Also purge orders that were never marked paid.")
+@click.option('--chunk-size', type=int, default=1000, show_default=True, help="Rows per DELETE/commit; 0 for one statement.")
+def purge_orders_command(end, start, statuses, include_unpaid, chunk_size):
+    """Delete finished orders in a date range, chunk by chunk."""
+    deleted = purge_orders(start.date() if start else None, end.date(), list(statuses),
+                           paid_only=not include_unpaid, chunk_size=chunk_size or None)
+    print(f"Deleted {deleted} orders")
+
+
+@bp.cli.command('archive-orders')
+@click.option('--older-than-days', type=int, default=None,
+              help="Archive orders created more than this many days ago (default: ARCHIVE_AFTER_DAYS).")
+@click.option('--batch-size', default=1000, show_default=True, help="Orders moved per transaction.")
+def archive_orders_command(older_than_days, batch_size):
+    """Move old Completed, paid orders into laundry_order_archive."""
+    days = older_than_days if older_than_days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    moved = archive_orders(datetime.now() - timedelta(days=days), batch_size)
+    print(f"Archived {moved} orders older than {days} days")
+
+
+@bp.cli.command('run-worker')
+@click.option('--once', is_flag=True, help="Run the jobs due now, then exit.")
+@click.option('--batch', default=20, show_default=True, help="Jobs claimed per round.")
+@click.option('--poll', default=1.0, show_default=True, help="Seconds to sleep when no job is due.")
+@click.option('--keep-days', default=7, show_default=True, help="Delete finished jobs older than this.")
+def run_worker(once, batch, poll, keep_days):
+    """Process background jobs from the job table (JOB_BACKEND=db). Start as many as needed."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"✅ Worker {worker_id} started")
+    last_cleanup = 0.0
+    while True:
+        claimed = claim_jobs(worker_id, batch)
+        for job_id in claimed:
+            run_job(job_id)
+
+        if time.monotonic() - last_cleanup > 3600:
+            cutoff = datetime.now() - timedelta(days=keep_days)
+            delete_rows(Job, [Job.status == 'done', Job.date_updated < cutoff])
+            db.session.commit()
+            last_cleanup = time.monotonic()
+
+        if once and not claimed:
+            break
+        if not claimed:
+            time.sleep(poll)
+
+
+# Upper bound on SQL statements for one admin dashboard render; exceeding it means an N+1 crept back in
+MAX_DASHBOARD_QUERIES = 8
+
+
+@bp.cli.command('check-dashboard-queries')
+def check_dashboard_queries():
+    """Render /admin as the first admin user and fail if it issues more than MAX_DASHBOARD_QUERIES statements."""
+    admin = User.query.filter_by(role='admin').first()
+    if not admin:
+        raise SystemExit("No admin user to render the dashboard as")
+
+    client = current_app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin.id
+        sess['role'] = admin.role
+
+    with QueryCounter() as counter:
+        resp = client.get('/admin')
+
+    print(f"/admin -> {resp.status_code}, {counter.count} queries (limit {MAX_DASHBOARD_QUERIES})")
+    if resp.status_code != 200 or counter.count > MAX_DASHBOARD_QUERIES:
+        for statement in counter.statements:
+            print("  ", " ".join(statement.split()))
+        raise SystemExit(1)
+
+
+@bp.route('/logout', methods=['GET', 'POST'])
 def logout():
     session.clear()  # clear all session data
     flash("You have been logged out.", "success")
-    return redirect(url_for('login'))  # redirect to login page
+    return redirect(url_for('shop.login'))  # redirect to login page
+
+
+# --- App factory ---
+def create_app(config=None):
+    """
+    Build a configured app. Nothing here talks to the database, so WSGI workers start
+    without a round-trip; run `flask --app app init-db` (or `upgrade-db`) once per deployment.
+    """
+    app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates'))
+    app.config.update(load_config())
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    session_db = app.config['SESSION_DB']
+    if app.config['SESSION_BACKEND'] == 'sqlite' and not session_db:
+        os.makedirs(app.instance_path, exist_ok=True)
+        session_db = os.path.join(app.instance_path, 'sessions.db')
+    session_interface = create_session_interface(app.config['SESSION_BACKEND'], session_db)
+    if session_interface:
+        app.session_interface = session_interface
+    with app.app_context():
+        instrument_engine(db.engine)
+    app.extensions['metrics'] = Metrics()
+    app.extensions['order_events'] = create_broker(app.config['EVENTS_DB'], app.config['MAX_EVENT_STREAMS'])
+    app.extensions['password_hasher'] = PasswordHasher(
+        max_workers=app.config['HASH_WORKERS'],
+        max_pending=app.config['HASH_QUEUE'],
+        method=app.config['PASSWORD_HASH_METHOD'],
+    )
+    def run_local_job(name, payload):
+        with app.app_context():
+            run_task(name, payload)
+
+    app.extensions['jobs'] = LocalJobQueue(
+        run_local_job, tasks, workers=app.config['JOB_WORKERS'], retry_base=app.config['JOB_RETRY_BASE']
+    )
+    app.extensions['prices'] = PriceCache(
+        price_rules_version, load_price_rules, check_interval=app.config['PRICE_CHECK_SECONDS']
+    )
+    app.extensions['response_cache'] = ResponseCache(
+        max_entries=app.config['RESPONSE_CACHE_SIZE'], ttl=app.config['RESPONSE_CACHE_TTL']
+    )
+    app.extensions['login_limits'] = {
+        'user': RateLimiter(app.config['LOGIN_USER_BURST'], app.config['LOGIN_USER_PER_MINUTE']),
+        'ip': RateLimiter(app.config['LOGIN_IP_BURST'], app.config['LOGIN_IP_PER_MINUTE']),
+    }
+    app.register_blueprint(bp)
+    return app
 
 
 # --- Run the app ---
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
 
 
@@ -0,0 +1,322 @@
+"""
+Load benchmark for the order and dashboard hot paths.
+
+    python bench.py                                  # SQLite temp DB, default volumes
+    python bench.py --orders 200000 --concurrency 16
+    python bench.py --db mysql+pymysql://root:@localhost/laundry_bench --wsgi
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --baseline bench_baseline.json   # exit 1 on regression
+
+Seeds users, orders and daily income in bulk, then drives concurrent clients
+through the Flask test client (or a local threaded WSGI server with --wsgi) and
+reports p50/p95/p99 latency, throughput and SQL queries per request.
+Never point --db at a database you care about: it is dropped and recreated.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+from app import create_app, db, User, LaundryOrder, Income, rebuild_income_rollups, rebuild_order_counters, seed_admin
+
+LAUNDRY_TYPES = ["Wash-Dry-Fold", "Wash-Dry-Press", "Press Only", "Special Items"]
+STATUSES = ["Pending", "Washing", "Drying", "Ready", "Claimed"]
+
+# name -> (method, path, json body, form body, acts as admin)
+SCENARIOS = {
+    'add_order': ('POST', '/add_order', {'laundry_type': 'Press Only', 'weight': 2.5, 'price': 100}, None, False),
+    'user_dashboard_post': ('POST', '/user', None, {'laundry_type': 'Wash-Dry-Fold', 'weight': '3'}, False),
+    'user_dashboard': ('GET', '/user', None, None, False),
+    'admin_dashboard': ('GET', '/admin', None, None, True),
+    'orders_page': ('GET', '/api/orders?limit=50', None, None, True),
+    'income_by_month': ('GET', '/api/income_by_month?days=0', None, None, True),
+    'income_by_week': ('GET', '/api/income_by_week', None, None, True),
+}
+
+
+# --- Seeding ---
+def seed(users, orders, income_days, batch=5000):
+    """Bulk-insert synthetic data with executemany (no ORM objects)."""
+    db.drop_all()
+    db.create_all()
+    seed_admin()
+
+    rng = random.Random(42)
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'customer{i}', 'password': 'x', 'role': 'customer'} for i in range(users)
+    ])
+    user_ids = [uid for (uid,) in db.session.query(User.id).filter(User.role == 'customer')]
+
+    start = datetime.now() - timedelta(days=max(income_days, 1))
+    span = int((datetime.now() - start).total_seconds())
+    rows = []
+    for _ in range(orders):
+        created = start + timedelta(seconds=rng.randrange(span))
+        pickup = rng.random() < 0.3
+        rows.append({
+            'user_id': rng.choice(user_ids),
+            'laundry_type': rng.choice(LAUNDRY_TYPES),
+            'weight_kg': round(rng.uniform(0.5, 10), 1),
+            'price': round(rng.uniform(20, 700), 2),
+            'status': rng.choice(STATUSES),
+            'pickup_requested': pickup,
+            'floor_number': str(rng.randint(1, 8)) if pickup else None,
+            'unit_number': str(rng.randint(101, 805)) if pickup else None,
+            'date_created': created,
+            'payment_status': 'Pending',
+            'is_paid': rng.random() < 0.5,
+        })
+        if len(rows) >= batch:
+            db.session.execute(LaundryOrder.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(LaundryOrder.__table__.insert(), rows)
+
+    today = date.today()
+    db.session.execute(Income.__table__.insert(), [
+        {'date': today - timedelta(days=d), 'total': round(rng.uniform(500, 5000), 2)} for d in range(income_days)
+    ])
+    db.session.commit()
+    rebuild_income_rollups()
+    rebuild_order_counters()
+    return user_ids
+
+
+# --- Query counting ---
+class ThreadQueryCounter:
+    """Counts statements per client thread (in-process) and in total (any thread)."""
+
+    def __init__(self, engine):
+        self.local = threading.local()
+        self.total = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+        with self._lock:
+            self.total += 1
+
+    def reset(self):
+        self.local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self.local, 'count', 0)
+
+
+# --- Clients ---
+class TestClientDriver:
+    """Runs requests in-process through the Flask test client."""
+    in_process = True
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, json_body, form, user_id, role):
+        # One logged-in client per identity and thread, so session setup stays out of the timings
+        clients = getattr(self.local, 'clients', None)
+        if clients is None:
+            clients = self.local.clients = {}
+        client = clients.get((user_id, role))
+        if client is None:
+            client = clients[(user_id, role)] = self.app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = user_id
+                sess['role'] = role
+        resp = client.open(path, method=method, json=json_body, data=form)
+        return resp.status_code
+
+
+class WSGIDriver:
+    """Runs a threaded werkzeug server on localhost and talks HTTP to it."""
+    in_process = False
+
+    def __init__(self, app):
+        self.app = app
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cookies = {}
+        self.lock = threading.Lock()
+
+    def _cookie(self, user_id, role):
+        # Log in once per identity through the app's own session interface, then reuse the cookie
+        key = (user_id, role)
+        with self.lock:
+            if key not in self.cookies:
+                client = self.app.test_client()
+                with client.session_transaction() as sess:
+                    sess['user_id'] = user_id
+                    sess['role'] = role
+                self.cookies[key] = client.get_cookie(self.app.config['SESSION_COOKIE_NAME']).value
+            return self.cookies[key]
+
+    def request(self, method, path, json_body, form, user_id, role):
+        headers = {'Cookie': f"{self.app.config['SESSION_COOKIE_NAME']}={self._cookie(user_id, role)}"}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            from urllib.parse import urlencode
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            return resp.status
+        finally:
+            conn.close()
+
+    def close(self):
+        self.server.shutdown()
+
+
+# --- Running ---
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(app, driver, counter, name, user_ids, admin_id, requests, concurrency):
+    method, path, json_body, form, as_admin = SCENARIOS[name]
+    rng = random.Random(name)
+    latencies, queries, errors = [], [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        user_id, role = (admin_id, 'admin') if as_admin else (rng.choice(user_ids), 'customer')
+        counter.reset()
+        started = time.perf_counter()
+        status = driver.request(method, path, json_body, form, user_id, role)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed * 1000)
+            queries.append(counter.count)
+            if status >= 400:
+                errors += 1
+
+    total_before = counter.total
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - wall
+    if not driver.in_process:
+        # Queries run on server threads: fall back to the average over the whole scenario
+        queries = [(counter.total - total_before) / requests] if requests else []
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'throughput_rps': round(requests / wall, 1) if wall else 0.0,
+        'queries_per_request': round(statistics.mean(queries), 2) if queries else 0.0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return regression messages: p95 beyond baseline * (1 + tolerance), or more queries per request."""
+    problems = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if not current:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms (+{tolerance:.0%})")
+        if current['queries_per_request'] > base['queries_per_request'] + 0.5:
+            problems.append(f"{name}: {current['queries_per_request']} queries/request > baseline {base['queries_per_request']}")
+        if current['errors']:
+            problems.append(f"{name}: {current['errors']} failed requests")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help="SQLAlchemy URL (default: a temporary SQLite file)")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--income-days', type=int, default=730)
+    parser.add_argument('--requests', type=int, default=200, help="requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help="repeatable; default all")
+    parser.add_argument('--wsgi', action='store_true', help="drive a local threaded WSGI server over HTTP")
+    parser.add_argument('--no-cache', action='store_true', help="disable the admin response cache")
+    parser.add_argument('--baseline', help="JSON file of a previous run; exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed p95 slowdown vs baseline")
+    parser.add_argument('--save-baseline', help="write this run's results to a JSON file")
+    args = parser.parse_args(argv)
+
+    url = args.db or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='laundry-bench-'), 'bench.db')}"
+    config = {'SQLALCHEMY_DATABASE_URI': url, 'RESPONSE_CACHE_TTL': 0 if args.no_cache else 30}
+    if url.startswith('sqlite'):
+        # Writers queue on SQLite's file lock instead of failing straight away
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    app = create_app(config)
+
+    with app.app_context():
+        print(f"Seeding {args.users} users, {args.orders} orders, {args.income_days} income days into {url} ...")
+        started = time.perf_counter()
+        user_ids = seed(args.users, args.orders, args.income_days)
+        admin_id = db.session.query(User.id).filter_by(role='admin').scalar()
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+        counter = ThreadQueryCounter(db.engine)
+
+    driver = WSGIDriver(app) if args.wsgi else TestClientDriver(app)
+    results = {}
+    try:
+        with app.app_context():
+            for name in args.scenario or list(SCENARIOS):
+                results[name] = run_scenario(app, driver, counter, name, user_ids, admin_id,
+                                             args.requests, args.concurrency)
+    finally:
+        if args.wsgi:
+            driver.close()
+
+    header = f"{'scenario':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'q/req':>8}{'errors':>8}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        print(f"{name:<22}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['throughput_rps']:>10}{r['queries_per_request']:>8}{r['errors']:>8}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for line in problems:
+            print("❌", line)
+        if problems:
+            return 1
+        print("✅ No regressions against", args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
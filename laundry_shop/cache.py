@@ -0,0 +1,53 @@
+"""
+Small in-process TTL + LRU cache for JSON responses of read-heavy admin endpoints.
+
+Entries carry tags ("income", "orders") so writes can drop exactly the responses
+they make stale. The cache is per worker process; the TTL bounds how long another
+worker can keep serving a response after a write it didn't see.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    def __init__(self, max_entries=256, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, tags, body, etag)
+        self._lock = threading.Lock()
+        # Bumped by every invalidate(); a response computed across a write is not stored
+        self.generation = 0
+
+    def get(self, key):
+        """Return (body, etag) for a fresh entry, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, body, etag = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, etag
+
+    def set(self, key, body, etag, tags=(), generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, frozenset(tags), body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of the tags (all entries when no tags are given)."""
+        with self._lock:
+            self.generation += 1
+            if not tags:
+                self._entries.clear()
+                return
+            stale = [key for key, entry in self._entries.items() if entry[1].intersection(tags)]
+            for key in stale:
+                del self._entries[key]
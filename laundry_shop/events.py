@@ -0,0 +1,130 @@
+"""
+Order event fan-out for the Server-Sent Events stream (/api/events).
+
+Request handlers publish small JSON events after they commit; each open stream
+holds only an in-memory queue, never a database connection, but it does hold a
+server thread for as long as it's open. `max_subscribers` caps the streams per
+process so they can't take every thread away from ordinary requests.
+
+- MemoryBroker: fan-out inside one process (dev server, tests).
+- SQLiteBroker: stand-in for a real pub/sub when running several worker processes.
+  Events are appended to a small local SQLite file and one poller thread per
+  process forwards new rows to that process's subscribers.
+"""
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+
+class MemoryBroker:
+    """In-process publish/subscribe with one bounded queue per subscriber."""
+
+    def __init__(self, queue_size=100, max_subscribers=None):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event_type, data):
+        self._dispatch({'type': event_type, 'data': data})
+
+    def _dispatch(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow client: drop the event rather than block the publisher
+                pass
+
+    def subscribe(self):
+        """A new subscriber queue, or None when max_subscribers streams are already open."""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def listen(self, q, heartbeat=15.0):
+        """Yield events for a subscribed queue; yields None every `heartbeat` seconds of silence."""
+        try:
+            while True:
+                try:
+                    yield q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield None
+        finally:
+            self.unsubscribe(q)
+
+
+class SQLiteBroker(MemoryBroker):
+    """Cross-process broker backed by a local SQLite file (one poller thread per process)."""
+
+    def __init__(self, path, poll_interval=0.5, retention=300, queue_size=100, max_subscribers=None):
+        super().__init__(queue_size=queue_size, max_subscribers=max_subscribers)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention  # seconds of events kept in the file
+        self._poller = None
+        self._poller_lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " created REAL NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def publish(self, event_type, data):
+        payload = json.dumps({'type': event_type, 'data': data})
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT INTO events (created, payload) VALUES (?, ?)", (now, payload))
+            conn.execute("DELETE FROM events WHERE created < ?", (now - self.retention,))
+
+    def subscribe(self):
+        self._ensure_poller()
+        return super().subscribe()
+
+    def _ensure_poller(self):
+        with self._poller_lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name="sse-event-poller", daemon=True)
+                self._poller.start()
+
+    def _poll(self):
+        conn = self._connect()
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                rows = conn.execute(
+                    "SELECT id, payload FROM events WHERE id > ? ORDER BY id", (last_id,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print("🔥 Event poller error:", e)
+                continue
+            for row_id, payload in rows:
+                last_id = row_id
+                self._dispatch(json.loads(payload))
+
+
+def create_broker(path=None, max_subscribers=None):
+    """SQLiteBroker when a file path is configured (multi-process), MemoryBroker otherwise."""
+    if path:
+        return SQLiteBroker(path, max_subscribers=max_subscribers)
+    return MemoryBroker(max_subscribers=max_subscribers)
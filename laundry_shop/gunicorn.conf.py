@@ -0,0 +1,18 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads let one worker serve long-lived /api/events streams next to normal requests. Each open
+# stream holds a thread; the app caps them at MAX_EVENT_STREAMS (default 8) per worker, so keep
+# WEB_THREADS comfortably above that
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 16))
+timeout = 60
+# Each worker builds its own app (and its own connection pool) after the fork
+preload_app = False
+
+# Without a shared events file each worker only sees the events its own requests publish
+if workers > 1 and not os.environ.get('LAUNDRY_EVENTS_DB'):
+    raise RuntimeError("Set LAUNDRY_EVENTS_DB to a local SQLite file when running more than one worker")
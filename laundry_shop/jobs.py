@@ -0,0 +1,81 @@
+"""
+Background jobs for side effects that shouldn't hold up a request (OTP delivery, income
+rollups, notifications).
+
+Request handlers call enqueue() (app.py), which only records the job; it runs after the
+request's transaction commits:
+
+- "db" backend: the job is a row in the job table, written in the same transaction as the
+  request's own changes and run by `flask run-worker` processes. Durable, retried with backoff.
+- "local" backend: LocalJobQueue runs jobs on a small in-process thread pool. Not durable;
+  meant for development and tests (drain() waits for the queue to empty).
+"""
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def backoff_delay(attempt, base=5.0, cap=600.0):
+    """Seconds before retry number `attempt` (1-based): exponential with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class TaskRegistry:
+    def __init__(self):
+        self._tasks = {}
+
+    def task(self, name, max_attempts=5):
+        """Decorator: register fn(**payload) under `name`."""
+        def decorator(fn):
+            self._tasks[name] = (fn, max_attempts)
+            return fn
+        return decorator
+
+    def get(self, name):
+        """The task function; KeyError for unknown names."""
+        return self._tasks[name][0]
+
+    def max_attempts(self, name):
+        return self._tasks[name][1]
+
+
+class LocalJobQueue:
+    """In-process backend. `run(name, payload)` performs one attempt and raises on failure."""
+
+    def __init__(self, run, registry, workers=2, retry_base=5.0):
+        self.run = run
+        self.registry = registry
+        self.retry_base = retry_base
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._pending = 0
+        self._idle = threading.Condition()
+
+    def submit(self, name, payload, attempt=0, delay=0.0):
+        with self._idle:
+            self._pending += 1
+        if delay:
+            timer = threading.Timer(delay, self._pool.submit, (self._attempt, name, payload, attempt))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._pool.submit(self._attempt, name, payload, attempt)
+
+    def _attempt(self, name, payload, attempt):
+        try:
+            self.run(name, payload)
+        except Exception as e:
+            attempt += 1
+            if attempt < self.registry.max_attempts(name):
+                print(f"🔥 Job {name} failed (attempt {attempt}), retrying:", e)
+                self.submit(name, payload, attempt, backoff_delay(attempt, self.retry_base))
+            else:
+                print(f"🔥 Job {name} failed permanently after {attempt} attempts:", e)
+        finally:
+            with self._idle:
+                self._pending -= 1
+                self._idle.notify_all()
+
+    def drain(self, timeout=None):
+        """Block until no job is queued, running or waiting to retry. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
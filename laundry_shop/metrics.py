@@ -0,0 +1,95 @@
+"""
+Per-route request and SQL metrics, rendered in the Prometheus text exposition format.
+
+The app records one observation per request (endpoint, method, status, wall time,
+SQL statement count and DB time). Numbers are per worker process: scrape each
+worker, or run a single worker when you need exact totals.
+"""
+import threading
+from collections import defaultdict
+
+# Request duration buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels.items()) + '}'
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)        # (endpoint, method, status) -> count
+        self._durations = {}                     # endpoint -> [bucket counts..., sum, count]
+        self._sql_statements = defaultdict(int)  # endpoint -> statements
+        self._sql_seconds = defaultdict(float)   # endpoint -> seconds spent in the database
+        self._slow = defaultdict(int)            # endpoint -> slow requests
+
+    def observe_request(self, endpoint, method, status, seconds, sql_statements=0, sql_seconds=0.0, slow=False):
+        with self._lock:
+            self._requests[(endpoint, method, status)] += 1
+            histogram = self._durations.get(endpoint)
+            if histogram is None:
+                histogram = self._durations[endpoint] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            self._sql_statements[endpoint] += sql_statements
+            self._sql_seconds[endpoint] += sql_seconds
+            if slow:
+                self._slow[endpoint] += 1
+
+    def render(self):
+        """Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            requests = dict(self._requests)
+            durations = {k: list(v) for k, v in self._durations.items()}
+            sql_statements = dict(self._sql_statements)
+            sql_seconds = dict(self._sql_seconds)
+            slow = dict(self._slow)
+
+        lines = [
+            '# HELP laundry_http_requests_total Requests handled, by endpoint, method and status.',
+            '# TYPE laundry_http_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'laundry_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+        lines += [
+            '# HELP laundry_http_request_duration_seconds Request wall time, by endpoint.',
+            '# TYPE laundry_http_request_duration_seconds histogram',
+        ]
+        for endpoint, histogram in sorted(durations.items()):
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(f'laundry_http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {count}')
+            lines.append(f'laundry_http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le="+Inf")} {histogram[-1]}')
+            lines.append(f'laundry_http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {histogram[-2]:.6f}')
+            lines.append(f'laundry_http_request_duration_seconds_count{_labels(endpoint=endpoint)} {histogram[-1]}')
+
+        lines += [
+            '# HELP laundry_sql_statements_total SQL statements executed while handling requests, by endpoint.',
+            '# TYPE laundry_sql_statements_total counter',
+        ]
+        for endpoint, count in sorted(sql_statements.items()):
+            lines.append(f'laundry_sql_statements_total{_labels(endpoint=endpoint)} {count}')
+
+        lines += [
+            '# HELP laundry_sql_duration_seconds_total Time spent executing SQL while handling requests, by endpoint.',
+            '# TYPE laundry_sql_duration_seconds_total counter',
+        ]
+        for endpoint, seconds in sorted(sql_seconds.items()):
+            lines.append(f'laundry_sql_duration_seconds_total{_labels(endpoint=endpoint)} {seconds:.6f}')
+
+        lines += [
+            '# HELP laundry_slow_requests_total Requests slower than SLOW_REQUEST_MS, by endpoint.',
+            '# TYPE laundry_slow_requests_total counter',
+        ]
+        for endpoint, count in sorted(slow.items()):
+            lines.append(f'laundry_slow_requests_total{_labels(endpoint=endpoint)} {count}')
+
+        return '\n'.join(lines) + '\n'
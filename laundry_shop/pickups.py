@@ -0,0 +1,73 @@
+"""
+Pickup run planning: split the orders waiting for pickup into runs a runner can carry.
+
+Stops (one per floor + unit) are visited lowest floor first, lowest unit first, and packed
+greedily into runs of at most `capacity_kg`, so each run covers a contiguous stretch of
+floors. A unit's orders stay in one run unless together they exceed the capacity; an order
+heavier than the capacity on its own gets a run of its own, flagged `over_capacity`.
+"""
+from itertools import groupby
+
+
+def location_key(value):
+    """Sort "2" before "10" (numeric floors / units), then other labels, then missing ones."""
+    if value is None or not str(value).strip():
+        return (2, 0, '')
+    value = str(value).strip()
+    # isdecimal(), not isdigit(): "²" is a digit that int() rejects
+    return (0, int(value), value) if value.isdecimal() else (1, 0, value.lower())
+
+
+def order_weight(order):
+    return float(order['weight_kg'] or 0)
+
+
+def plan_pickup_runs(orders, capacity_kg):
+    """
+    orders: dicts with floor_number, unit_number, weight_kg (and whatever else the caller wants
+    echoed back). Returns a list of runs:
+    {'floors': [...], 'weight_kg': total, 'over_capacity': bool, 'stops': [{'floor', 'unit', 'weight_kg', 'orders'}]}
+    """
+    if capacity_kg <= 0:
+        raise ValueError("capacity_kg must be positive")
+
+    # Oldest order first within a unit (ids ascend with creation)
+    ordered = sorted(orders, key=lambda o: (location_key(o['floor_number']), location_key(o['unit_number']),
+                                            o.get('id') or 0))
+    runs = []
+    current = None
+
+    def start_run():
+        run = {'floors': [], 'weight_kg': 0.0, 'over_capacity': False, 'stops': []}
+        runs.append(run)
+        return run
+
+    def add(run, floor, unit, order):
+        weight = order_weight(order)
+        stop = run['stops'][-1] if run['stops'] else None
+        if not stop or (stop['floor'], stop['unit']) != (floor, unit):
+            stop = {'floor': floor, 'unit': unit, 'weight_kg': 0.0, 'orders': []}
+            run['stops'].append(stop)
+            if floor not in run['floors']:
+                run['floors'].append(floor)
+        stop['orders'].append(order)
+        stop['weight_kg'] = round(stop['weight_kg'] + weight, 3)
+        run['weight_kg'] = round(run['weight_kg'] + weight, 3)
+
+    for (floor, unit), stop_orders in groupby(ordered, key=lambda o: (o['floor_number'], o['unit_number'])):
+        stop_orders = list(stop_orders)
+        stop_weight = sum(order_weight(o) for o in stop_orders)
+        # Keep the unit in one run when it fits in an empty one
+        if current and current['weight_kg'] + stop_weight > capacity_kg and stop_weight <= capacity_kg:
+            current = None
+        for order in stop_orders:
+            weight = order_weight(order)
+            if weight > capacity_kg:
+                oversize = start_run()
+                oversize['over_capacity'] = True
+                add(oversize, floor, unit, order)
+                continue
+            if current is None or current['weight_kg'] + weight > capacity_kg:
+                current = start_run()
+            add(current, floor, unit, order)
+    return runs
@@ -0,0 +1,119 @@
+"""
+Server-side pricing from the price_rule table, held in memory.
+
+PriceBook is an immutable snapshot of every rule (per-kg rates and the delivery fee, each
+with an effective date range), so quoting a price never touches the database.
+PriceCache swaps in a new snapshot when the rules' version changes: at once in the worker
+that changed them, and within `check_interval` seconds in every other worker.
+"""
+import threading
+import time
+from datetime import date
+
+# Used while the price_rule table is empty (fresh database, before `flask upgrade-db`)
+DEFAULT_RATES = {
+    "Wash-Dry-Fold": 250,
+    "Wash-Dry-Press": 300,
+    "Press Only": 100,
+    "Dry Cleaning": 450,
+}
+DEFAULT_DELIVERY_FEE = 70
+
+PER_KG = 'per_kg'
+DELIVERY_FEE = 'delivery_fee'
+RULE_KINDS = (PER_KG, DELIVERY_FEE)
+
+
+class PriceRuleView:
+    """The fields PriceBook needs from a rule; plain values, safe to share between threads."""
+    __slots__ = ('kind', 'laundry_type', 'amount', 'effective_from', 'effective_to', 'rule_id')
+
+    def __init__(self, kind, laundry_type, amount, effective_from=None, effective_to=None, rule_id=0):
+        self.rule_id = rule_id
+        self.kind = kind
+        self.laundry_type = laundry_type
+        self.amount = float(amount)
+        self.effective_from = effective_from
+        self.effective_to = effective_to
+
+    def applies_on(self, day):
+        if self.effective_from and day < self.effective_from:
+            return False
+        return not (self.effective_to and day >= self.effective_to)
+
+
+class PriceBook:
+    def __init__(self, rules, version=None):
+        self.version = version
+        # Latest effective_from first (newest rule on ties), so the first rule that applies on a day wins
+        self._rules = sorted(rules, key=lambda r: (r.effective_from or date.min, r.rule_id), reverse=True)
+
+    @classmethod
+    def defaults(cls):
+        rules = [PriceRuleView(PER_KG, name, amount) for name, amount in DEFAULT_RATES.items()]
+        rules.append(PriceRuleView(DELIVERY_FEE, None, DEFAULT_DELIVERY_FEE))
+        return cls(rules, version='defaults')
+
+    def _amount(self, kind, laundry_type, day):
+        for rule in self._rules:
+            if rule.kind == kind and rule.laundry_type == laundry_type and rule.applies_on(day):
+                return rule.amount
+        return None
+
+    def rate(self, laundry_type, day=None):
+        """Per-kg rate on `day` (default today), or None when the type isn't sold then."""
+        return self._amount(PER_KG, laundry_type, day or date.today())
+
+    def delivery_fee(self, day=None):
+        return self._amount(DELIVERY_FEE, None, day or date.today()) or 0.0
+
+    def rates(self, day=None):
+        """{laundry_type: per-kg rate} for everything on sale on `day`, in name order."""
+        day = day or date.today()
+        types = sorted({r.laundry_type for r in self._rules if r.kind == PER_KG})
+        return {t: rate for t in types if (rate := self.rate(t, day)) is not None}
+
+    def quote(self, laundry_type, weight, pickup_requested=False, day=None):
+        """Order price: weight x rate, plus the delivery fee. Raises ValueError for unknown types."""
+        rate = self.rate(laundry_type, day)
+        if rate is None:
+            raise ValueError(f"Unknown laundry type: {laundry_type}")
+        price = rate * weight
+        if pickup_requested:
+            price += self.delivery_fee(day)
+        return round(price, 2)
+
+
+class PriceCache:
+    """
+    load_version() -> a cheap, comparable version of the rule table.
+    load_rules() -> iterable of PriceRuleView.
+    Both are called only on refresh; current() otherwise returns the held PriceBook.
+    """
+
+    def __init__(self, load_version, load_rules, check_interval=5.0):
+        self.load_version = load_version
+        self.load_rules = load_rules
+        self.check_interval = check_interval
+        self._book = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        book = self._book
+        if book is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return book
+        with self._lock:
+            if self._book is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._book
+            version = self.load_version()
+            if self._book is None or self._book.version != version:
+                rules = list(self.load_rules())
+                self._book = PriceBook(rules, version) if rules else PriceBook.defaults()
+                self._book.version = version
+            self._checked_at = time.monotonic()
+            return self._book
+
+    def invalidate(self):
+        """Re-check the version on the next lookup (after this worker changed the rules)."""
+        self._checked_at = 0.0
@@ -0,0 +1,89 @@
+"""
+Login protection: password hashing on a bounded thread pool and token-bucket throttling.
+
+Hashing is deliberately slow CPU work. Running it on a small fixed pool caps how many
+hashes run at once; when the pool and its short queue are full, callers get
+HasherBusy straight away instead of every worker thread piling up behind hashes.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashes are already running or queued."""
+
+
+class PasswordHasher:
+    def __init__(self, max_workers=2, max_pending=8, method=None, timeout=10.0):
+        """
+        max_workers: hashes computed concurrently.
+        max_pending: extra requests allowed to wait for a free slot before HasherBusy.
+        method: werkzeug hash method/cost, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000";
+                None uses werkzeug's default.
+        """
+        self.method = method
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the hash itself finishes, even if the caller stops waiting,
+        # so the slots always bound the pool's real backlog
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy()
+
+    def hash(self, password):
+        if self.method:
+            return self._run(generate_password_hash, password, self.method)
+        return self._run(generate_password_hash, password)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+
+class RateLimiter:
+    """
+    In-process token buckets keyed by string (e.g. "user:alice", "ip:10.0.0.5").
+    Each key holds up to `burst` tokens and regains `per_minute` tokens a minute.
+    Limits are per worker process, which is enough to blunt login storms.
+    """
+
+    def __init__(self, burst, per_minute, max_keys=10000):
+        self.burst = float(burst)
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return allowed
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = self.burst / self.rate if self.rate else float('inf')
+        for key, (_, last) in list(self._buckets.items()):
+            if now - last >= full_after:
+                del self._buckets[key]
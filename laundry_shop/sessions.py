@@ -0,0 +1,180 @@
+"""
+Server-side sessions: the cookie carries only a random session id, the data lives in a store.
+
+- MemorySessionStore: one process (dev server, tests).
+- SQLiteSessionStore: a local SQLite file shared by every worker process on the host.
+
+Each stored session records its user_id, so an admin can revoke all of a user's sessions
+(delete_user) and the next request from any worker finds no session.
+"""
+import json
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, data=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(data, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.stale_sid = None
+
+    def regenerate(self):
+        """Issue a new session id on save (call on login, against session fixation)."""
+        if self.sid and not self.new:
+            self.stale_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class MemorySessionStore:
+    def __init__(self):
+        self._sessions = {}  # sid -> (expires, user_id, data)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None or entry[0] < time.time():
+                self._sessions.pop(sid, None)
+                return None
+            return dict(entry[2])
+
+    def set(self, sid, data, user_id, ttl):
+        with self._lock:
+            self._sessions[sid] = (time.time() + ttl, user_id, dict(data))
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def delete_user(self, user_id):
+        """Drop every session of a user; returns how many there were."""
+        with self._lock:
+            sids = [sid for sid, entry in self._sessions.items() if entry[1] == user_id]
+            for sid in sids:
+                del self._sessions[sid]
+            return len(sids)
+
+
+class SQLiteSessionStore:
+    def __init__(self, path, cleanup_every=500):
+        self.path = path
+        self.cleanup_every = cleanup_every
+        self._writes = 0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " sid TEXT PRIMARY KEY,"
+            " user_id INTEGER,"
+            " expires REAL NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_user_id ON sessions (user_id)")
+        conn.commit()
+
+    def _connect(self):
+        # One connection per thread, kept open: a session read is then a single indexed SELECT
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, sid):
+        row = self._connect().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires >= ?", (sid, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, sid, data, user_id, ttl):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (sid, user_id, expires, data) VALUES (?, ?, ?, ?)",
+                (sid, user_id, now + ttl, json.dumps(data)),
+            )
+            self._writes += 1
+            if self._writes % self.cleanup_every == 0:
+                conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+
+    def delete(self, sid):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def delete_user(self, user_id):
+        conn = self._connect()
+        with conn:
+            return conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,)).rowcount
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                return ServerSession(data, sid=sid)
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.stale_sid:
+            self.store.delete(session.stale_sid)
+        if not session:
+            if session.modified and not session.new:
+                if session.sid:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        response.vary.add('Cookie')
+        if not session.sid:
+            session.sid = secrets.token_urlsafe(32)
+        ttl = app.permanent_session_lifetime.total_seconds()
+        self.store.set(session.sid, dict(session), session.get('user_id'), ttl)
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def create(self, app, data):
+        """Store a new session and return its id (scripts and benchmarks)."""
+        sid = secrets.token_urlsafe(32)
+        self.store.set(sid, data, data.get('user_id'), app.permanent_session_lifetime.total_seconds())
+        return sid
+
+
+def create_session_interface(backend, path=None):
+    """None keeps Flask's signed-cookie sessions; "memory" or "sqlite" store them server-side."""
+    if backend == 'memory':
+        return ServerSessionInterface(MemorySessionStore())
+    if backend == 'sqlite':
+        return ServerSessionInterface(SQLiteSessionStore(path))
+    if backend == 'cookie':
+        return None
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
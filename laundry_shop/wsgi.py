@@ -0,0 +1,17 @@
+"""
+Production entry point.
+
+    flask --app app init-db            # once: create tables + default admin
+    gunicorn -c gunicorn.conf.py wsgi:app
+    JOB_BACKEND=db flask --app app run-worker   # background jobs; run one or more
+
+Settings come from the environment (see load_config() in app.py): DATABASE_URL,
+SECRET_KEY, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+DB_POOL_TIMEOUT, LAUNDRY_EVENTS_DB (needed with more than one worker) and JOB_BACKEND
+(set it to "db" for the web workers too, so jobs land in the job table). With the default
+"local" backend order income is still written in the order's own transaction; only OTP
+delivery runs on the in-process thread pool.
+"""
+from app import create_app
+
+app = create_app()